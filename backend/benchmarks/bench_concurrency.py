@@ -0,0 +1,58 @@
+"""
+Checks that concurrent requests to the backend overlap instead of serializing
+on the event loop. Run from the backend directory:
+
+    python -m benchmarks.bench_concurrency --requests 20 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import time
+import httpx
+from benchmarks.stub_github import create_app, serve_in_thread
+
+
+async def run(requests, latency, port):
+    os.environ["GITHUB_API_URL"] = f"http://127.0.0.1:{port}"
+    for name in ("GITHUB_CLIENT_ID", "GITHUB_CLIENT_SECRET", "OAUTH_CALLBACK_URL", "GROQ_API_KEY"):
+        os.environ.setdefault(name, "bench")
+    # Force a (conditional) upstream request every time so the stub latency is measured
+    os.environ.setdefault("GITHUB_CACHE_TTL", "0")
+    import main
+
+    await main.session_store.set("bench", "bench-token")
+    params = {"repo_url": "https://github.com/octo/repo", "pr_number": 1, "state": "bench"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client:
+        # Warm up the shared connection pool
+        (await client.get("/api/pr-status", params=params)).raise_for_status()
+
+        start = time.perf_counter()
+        single = await client.get("/api/pr-status", params=params)
+        single.raise_for_status()
+        one = time.perf_counter() - start
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.get("/api/pr-status", params=params) for _ in range(requests)])
+        total = time.perf_counter() - start
+    await main.close_pools()
+
+    failed = sum(1 for r in responses if r.status_code != 200)
+    print(f"single request:            {one * 1000:8.1f} ms")
+    print(f"{requests} concurrent requests:   {total * 1000:8.1f} ms (failed: {failed})")
+    print(f"serialized would take:     {one * requests * 1000:8.1f} ms")
+    print(f"overlap factor:            {one * requests / total:8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    serve_in_thread(create_app(latency=args.latency), args.port)
+    asyncio.run(run(args.requests, args.latency, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compares a fresh AsyncClient per request (the old behaviour) with the shared
+"github" pool against the local GitHub stub. Run from the backend directory:
+
+    python -m benchmarks.bench_http_pools --requests 200
+
+The stub speaks plain HTTP, so the savings shown are TCP connects only;
+against api.github.com every avoided connect also avoids a TLS handshake.
+"""
+import argparse
+import asyncio
+import os
+import time
+import httpx
+from benchmarks.stub_github import create_app, serve_in_thread
+
+
+async def run(requests, concurrency, port):
+    base_url = f"http://127.0.0.1:{port}"
+    os.environ["GITHUB_API_URL"] = base_url
+    import http_pools
+
+    connects = 0
+
+    async def count(event, info):
+        nonlocal connects
+        if event == "connection.connect_tcp.complete":
+            connects += 1
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fresh_client():
+        async with semaphore:
+            async with httpx.AsyncClient(base_url=base_url) as client:
+                (await client.get("/user", extensions={"trace": count})).raise_for_status()
+
+    async def pooled():
+        async with semaphore:
+            (await http_pools.get_pool("github").request("GET", "/user")).raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[fresh_client() for _ in range(requests)])
+    fresh = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*[pooled() for _ in range(requests)])
+    shared = time.perf_counter() - start
+    stats = http_pools.get_pool("github").stats()
+    await http_pools.close_pools()
+
+    print(f"{'mode':<22}{'total ms':>10}{'req/s':>10}{'connects':>10}")
+    print(f"{'client per request':<22}{fresh * 1000:>10.1f}{requests / fresh:>10.0f}{connects:>10}")
+    print(f"{'shared pool':<22}{shared * 1000:>10.1f}{requests / shared:>10.0f}{stats['connections_opened']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    serve_in_thread(create_app(latency=args.latency), args.port)
+    asyncio.run(run(args.requests, args.concurrency, args.port))
+
+
+if __name__ == "__main__":
+    main()
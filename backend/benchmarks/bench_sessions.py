@@ -0,0 +1,95 @@
+"""
+Runs the backend under `uvicorn --workers N` and checks that a login handled
+by one worker is honoured by all of them. Run from the backend directory:
+
+    python -m benchmarks.bench_sessions --workers 4 --requests 400
+
+Each configured SESSION_STORE is measured in turn; with the in-memory store
+most requests fail with "not logged in" because they land on other workers.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import httpx
+from benchmarks.stub_github import create_app, serve_in_thread
+
+
+def start_backend(port, workers, session_store, stub_url):
+    env = {
+        **os.environ,
+        "GITHUB_API_URL": stub_url,
+        "GITHUB_WEB_URL": stub_url,
+        "SESSION_STORE": session_store,
+        "GITHUB_CLIENT_ID": "bench",
+        "GITHUB_CLIENT_SECRET": "bench",
+        "OAUTH_CALLBACK_URL": "http://localhost/callback",
+        "GROQ_API_KEY": "bench",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+        # Rejected requests print tracebacks; keep the report readable
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/login/github", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("backend did not start")
+
+
+async def drive(port, requests, concurrency):
+    base_url = f"http://127.0.0.1:{port}"
+    state = str(uuid.uuid4())
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        await client.get("/auth/github/callback", params={"code": "bench", "state": state})
+
+        async def call():
+            async with semaphore:
+                resp = await client.get("/api/github-user", params={"state": state})
+                return resp.status_code == 200
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[call() for _ in range(requests)])
+        elapsed = time.perf_counter() - start
+    return sum(results), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--stub-port", type=int, default=8768)
+    parser.add_argument("--stores", default="memory,sqlite", help="comma-separated: memory, sqlite, or a redis:// URL")
+    args = parser.parse_args()
+    serve_in_thread(create_app(latency=0.0), args.stub_port)
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+
+    print(f"{'store':<28}{'ok':>8}{'failed':>8}{'req/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for store in args.stores.split(","):
+            url = f"sqlite:///{os.path.join(tmp, 'sessions.sqlite3')}" if store == "sqlite" else store
+            proc = start_backend(args.port, args.workers, url, stub_url)
+            try:
+                ok, elapsed = asyncio.run(drive(args.port, args.requests, args.concurrency))
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f"{store:<28}{ok:>8}{args.requests - ok:>8}{args.requests / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
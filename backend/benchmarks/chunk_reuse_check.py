@@ -0,0 +1,102 @@
+"""
+Checks that a push touching one file only re-reviews that file's chunk: reviews
+a synthetic PR through the prefilter and the chunk cache against the Groq stub,
+edits one file (a line added, then a large growth) and counts the chunk reviews
+that miss the cache. Run from the backend directory:
+
+    python -m benchmarks.chunk_reuse_check
+
+The exit status is 1 when any check fails.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from benchmarks import stub_groq
+from benchmarks.stub_github import serve_in_thread
+
+# Repeated in two files, long enough for the prefilter to back-reference it
+SHARED_HUNK = "@@ -1,3 +1,3 @@\n" + "".join(f"-old_setting_{i} = {i}\n+new_setting_{i} = {i + 1}\n" for i in range(8))
+
+
+def pr_files(count, edit=""):
+    files = []
+    for i in range(count):
+        patch = f"@@ -1,2 +1,3 @@\n def f{i}():\n+    return {i}\n" + "".join(f"+    x{j} = {j}\n" for j in range(6))
+        if i == 0:
+            patch += edit
+        if i in (5, 9):
+            patch += SHARED_HUNK
+        files.append({"filename": f"pkg/f{i}.py", "status": "modified", "patch": patch})
+    return files
+
+
+async def run(port, count):
+    os.environ["GROQ_API_URL"] = f"http://127.0.0.1:{port}/openai/v1"
+    from diff_filter import prefilter
+    from http_pools import close_pools
+    from review import GroqReviewer, chunk_diff, ends_chunk
+    from review_cache import ReviewCache
+
+    failed = []
+
+    def check(ok, what):
+        if not ok:
+            failed.append(what)
+
+    async def aiter(items):
+        for item in items:
+            yield item
+
+    def files_in(chunk):
+        return [line.split()[2] for line in chunk.splitlines() if line.startswith("# File: ")]
+
+    async def chunks_of(files):
+        return chunk_diff([pair async for pair in prefilter(aiter(files))], budget=300, files_per_chunk=4)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cache = ReviewCache(os.path.join(workdir, "reviews.sqlite3"))
+        reviewer = GroqReviewer("bench", "bench-model", chunk_tokens=300, chunk_files=4, cache=cache)
+        base = await chunks_of(pr_files(count))
+        run_of_f0 = set()
+        for i in range(count):
+            run_of_f0.add(f"pkg/f{i}.py")
+            if ends_chunk(f"pkg/f{i}.py", 4):
+                break
+        await reviewer.review(prefilter(aiter(pr_files(count))))
+        check(len(base) > 2, "the PR spans several chunks")
+        print(f"initial review:             {len(base)} chunks, {cache.misses} reviewed")
+
+        for name, edit in (("one line added", "+    y = 1\n"), ("file grown", "".join(f"+    y{j} = {j}\n" for j in range(60)))):
+            edited = await chunks_of(pr_files(count, edit))
+            changed = [c for c in edited if c not in base]
+            # Boundaries may only move between the edited file and the next file that ends a chunk
+            check(all(set(files_in(c)) <= run_of_f0 for c in changed), f"{name}: only the edited file's chunks change")
+            check(all(c in edited for c in base if not set(files_in(c)) & run_of_f0), f"{name}: every other chunk keeps its text")
+            greedy = chunk_diff([pair async for pair in prefilter(aiter(pr_files(count, edit)))], budget=300)
+            greedy_base = chunk_diff([pair async for pair in prefilter(aiter(pr_files(count)))], budget=300)
+            print(f"{name + ' (greedy):':<27} {sum(1 for c in greedy if c in greedy_base)} of {len(greedy)} chunks reusable")
+            misses = cache.misses
+            await reviewer.review(prefilter(aiter(pr_files(count, edit))))
+            print(f"{name + ':':<27} {len(edited)} chunks, {cache.misses - misses} re-reviewed")
+            check(cache.misses - misses == len(changed), f"{name}: only the changed chunks miss the cache")
+    await close_pools()
+
+    for what in failed:
+        print("FAILED", what)
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+    serve_in_thread(stub_groq.create_app(latency=0.01), args.port)
+    if not asyncio.run(run(args.port, args.files)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Exercises the local git mirror against throwaway repositories: builds a
+source repo with a refs/pull/N/head ref, mirrors it through a
+GIT_MIRROR_REMOTE-style path template and checks commit lists, diffs,
+incremental syncs, the base-ref fallback and LRU eviction. Run from the
+backend directory:
+
+    python -m benchmarks.git_mirror_check
+
+The exit status is 1 when any check fails.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from git_mirror import GitMirror, parse_raw_numstat
+
+GIT = ["git", "-c", "user.name=Ann", "-c", "user.email=ann@example.com", "-c", "init.defaultBranch=main"]
+
+
+def git(cwd, *args):
+    return subprocess.run(GIT + list(args), cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build_repo(root, owner_repo):
+    """
+    main: init (x, logo.bin); PR 1: rename x to "y z" with an edit, binary
+    change, a minified file, then a new file; main then moves on.
+    Returns (base_sha, head_sha).
+    """
+    path = os.path.join(root, owner_repo)
+    os.makedirs(path)
+    git(path, "init", "-q")
+    write(os.path.join(path, "x"), b"a\nb\n")
+    write(os.path.join(path, "logo.bin"), b"\x00\x01\x02")
+    git(path, "add", ".")
+    git(path, "commit", "-qm", "init")
+    base = git(path, "rev-parse", "HEAD")
+    git(path, "checkout", "-qb", "feature")
+    git(path, "mv", "x", "y z")
+    write(os.path.join(path, "y z"), b"a\nb\nc\n")
+    write(os.path.join(path, "logo.bin"), b"\x00\x01\x03")
+    write(os.path.join(path, "app.min.js"), b"q" * 200000 + b"\n")
+    git(path, "add", "-A")
+    git(path, "commit", "-qm", "Rename x\n\nAnd more.")
+    write(os.path.join(path, "new.py"), b"print('hi')\n")
+    git(path, "add", "new.py")
+    git(path, "commit", "-qm", "Add new.py")
+    head = git(path, "rev-parse", "HEAD")
+    git(path, "update-ref", "refs/pull/1/head", head)
+    git(path, "checkout", "-q", "main")
+    write(os.path.join(path, "later"), b"on main after the PR branched\n")
+    git(path, "add", "later")
+    git(path, "commit", "-qm", "Later main commit")
+    return base, head
+
+
+async def run(workdir):
+    failed = []
+
+    def check(ok, what):
+        if not ok:
+            failed.append(what)
+
+    # Parsing: a rename with an edit, and a binary file, in one -z --raw --numstat listing
+    files = parse_raw_numstat(
+        b":100644 100644 aaa bbb R066\0x\0y z\0:100644 100644 ccc ddd M\0bin\0"
+        b"1\t0\t\0x\0y z\0-\t-\tbin\0"
+    )
+    check(files == [
+        {"filename": "y z", "status": "renamed", "previous_filename": "x", "additions": 1, "deletions": 0, "changes": 1},
+        {"filename": "bin", "status": "modified", "additions": 0, "deletions": 0, "changes": 0},
+    ], "parse_raw_numstat handles renames and binary files")
+
+    source = os.path.join(workdir, "src")
+    base, head = build_repo(source, "octo/repo")
+    other_base, other_head = build_repo(source, "octo/other")
+    mirror = GitMirror(os.path.join(workdir, "mirrors"), max_bytes=10 ** 9, remote=os.path.join(source, "{owner_repo}"))
+    pr = {"number": 1, "head": {"sha": head}, "base": {"sha": base, "ref": "main"}}
+
+    start = time.perf_counter()
+    synced = await mirror.sync("octo/repo", None, pr)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    await mirror.sync("octo/repo", None, pr)
+    warm = time.perf_counter() - start
+    check(synced == base, "sync returns the PR's base SHA")
+    check(mirror.fetches == 1 and mirror.up_to_date == 1, "a second sync of the same head does not fetch")
+
+    commits = [(c, files) async for c, files in mirror.iter_commits("octo/repo", synced, head)]
+    check([c["commit"]["message"] for c, _ in commits] == ["Rename x\n\nAnd more.", "Add new.py"],
+          "iter_commits lists the PR's commits oldest first")
+    check(all(c["commit"]["author"]["name"] == "Ann" for c, _ in commits), "commits carry the git author")
+    first = {f["filename"]: f["patch"] for f in commits[0][1]}
+    check(sorted(first) == ["app.min.js", "logo.bin", "y z"], "first commit touches the renamed, binary and minified files")
+    check(first.get("logo.bin") == "(No patch available)", "binary files have no patch")
+    check(len(first.get("app.min.js", "")) > 200000, "large patches are not truncated")
+    check(first.get("y z", "").startswith("@@") and "+c" in first.get("y z", ""), "patches start at the hunk header")
+
+    pr_files = {f["filename"]: f async for f in mirror.iter_pr_files("octo/repo", synced, head)}
+    check(sorted(pr_files) == ["app.min.js", "logo.bin", "new.py", "y z"], "PR files are diffed from the merge base")
+    renamed = pr_files.get("y z", {})
+    check(renamed.get("status") == "renamed" and renamed.get("previous_filename") == "x", "renames keep the previous name")
+    check((renamed.get("additions"), renamed.get("deletions")) == (1, 0), "renames count their line changes")
+    check("patch" not in pr_files.get("logo.bin", {}), "binary PR files have no patch, like on GitHub")
+
+    # A force-pushed base no longer has the recorded base SHA; the base branch is used instead
+    gone = {"number": 1, "head": {"sha": head}, "base": {"sha": "f" * 40, "ref": "main"}}
+    check(await mirror.sync("octo/repo", None, gone) == "refs/heads/main", "missing base SHAs fall back to the base branch")
+
+    # Eviction: room for one mirror, so syncing a second evicts the least recently used one
+    mirror.max_bytes = int(mirror.sizes[mirror.path("octo/repo")] * 1.5)
+    other = {"number": 1, "head": {"sha": other_head}, "base": {"sha": other_base, "ref": "main"}}
+    await mirror.sync("octo/other", None, other)
+    check(not os.path.isdir(mirror.path("octo/repo")), "the least recently used mirror is evicted")
+    check(os.path.isdir(mirror.path("octo/other")) and mirror.evictions == 1, "the mirror just synced is kept")
+    # Mirrors in use are never evicted, even over budget
+    mirror.max_bytes = 1
+    async with mirror.use("octo/other"):
+        await mirror.evict()
+        check(os.path.isdir(mirror.path("octo/other")), "mirrors in use are not evicted")
+
+    try:
+        mirror.path("../etc")
+        check(False, "repository names are validated")
+    except ValueError:
+        pass
+
+    print(f"cold sync:                  {cold * 1000:8.1f} ms")
+    print(f"warm sync:                  {warm * 1000:8.1f} ms")
+    print(f"mirror stats:               {mirror.stats()}")
+    for what in failed:
+        print("FAILED", what)
+    return not failed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        ok = asyncio.run(run(workdir))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
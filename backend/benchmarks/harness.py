@@ -0,0 +1,222 @@
+"""
+End-to-end benchmark of the backend's endpoints against local GitHub and Groq
+stubs. Each endpoint gets a fresh `uvicorn main:app` process, is driven under
+concurrency, and is reported with p50/p99 latency, throughput, upstream calls
+and the backend's peak RSS. Run from the backend directory:
+
+    python -m benchmarks.harness --scenario medium --requests 200 --concurrency 20
+
+Save a run with --json and compare a later one against it with --baseline;
+the exit status is 1 when any endpoint regressed by more than --tolerance.
+Peak RSS is read from /proc, so it is only reported on Linux.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import httpx
+from benchmarks import stub_groq
+from benchmarks.stub_github import create_app, serve_in_thread
+
+# PR shapes, from a one-line fix to a 500-commit, 5k-file monster
+SCENARIOS = {
+    "tiny": {"pr_count": 3, "commits_per_pr": 1, "files_per_commit": 1, "pr_files": 1, "patch_lines": 2},
+    "small": {"pr_count": 10, "commits_per_pr": 3, "files_per_commit": 2, "pr_files": 5, "patch_lines": 10},
+    "medium": {"pr_count": 30, "commits_per_pr": 20, "files_per_commit": 5, "pr_files": 100, "patch_lines": 20,
+               "check_runs_per_commit": 5, "annotations_per_run": 10},
+    "large": {"pr_count": 100, "commits_per_pr": 100, "files_per_commit": 10, "pr_files": 1000, "patch_lines": 20,
+              "check_runs_per_commit": 20, "annotations_per_run": 50},
+    "huge": {"pr_count": 300, "commits_per_pr": 500, "files_per_commit": 10, "pr_files": 5000, "patch_lines": 10,
+             "check_runs_per_commit": 50, "annotations_per_run": 200},
+}
+
+# name -> (method, path, extra params); every request also gets repo_url, state and a pr_number
+ENDPOINTS = {
+    "github-user": ("GET", "/api/github-user", {}),
+    "list-prs": ("GET", "/api/list-prs", {}),
+    "pr-status": ("GET", "/api/pr-status", {}),
+    "pr-check-summaries": ("GET", "/api/pr-check-summaries", {}),
+    "pr-dashboard": ("GET", "/api/pr-dashboard", {}),
+    "pr-commits-with-diffs": ("GET", "/api/pr-commits-with-diffs", {}),
+    "pr-commits-stream": ("GET", "/api/pr-commits-with-diffs", {"stream": 1}),
+    "review-pr": ("GET", "/api/review-pr", {}),
+}
+
+# Relative increases (or throughput drops) beyond the tolerance count as regressions
+COMPARED = {"p50_ms": 1, "p99_ms": 1, "steady_upstream_per_request": 1, "peak_rss_mb": 1, "throughput": -1}
+
+
+def start_backend(port, github_url, groq_url, workdir):
+    env = {
+        **os.environ,
+        "GITHUB_API_URL": github_url,
+        "GITHUB_WEB_URL": github_url,
+        "GROQ_API_URL": groq_url + "/openai/v1",
+        "GITHUB_CLIENT_ID": "bench",
+        "GITHUB_CLIENT_SECRET": "bench",
+        "OAUTH_CALLBACK_URL": "http://localhost/callback",
+        "GROQ_API_KEY": "bench",
+        # Fresh on-disk caches for every endpoint
+        "REVIEW_CACHE_PATH": os.path.join(workdir, "review_cache.sqlite3"),
+        "PR_INDEX_PATH": os.path.join(workdir, "pr_index.sqlite3"),
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/cache-stats", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("backend did not start")
+
+
+def peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+async def drive(port, endpoint, requests, concurrency, pr_count, stubs):
+    method, path, extra = ENDPOINTS[endpoint]
+    state = str(uuid.uuid4())
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    def upstream_calls():
+        return sum(stub.state.calls for stub in stubs)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+        await client.get("/auth/github/callback", params={"code": "bench", "state": state})
+
+        async def call(i):
+            nonlocal errors
+            params = {"repo_url": "https://github.com/octo/repo", "state": state, "pr_number": i % pr_count + 1, **extra}
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    resp = await client.request(method, path, params=params)
+                    ok = resp.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                if not ok:
+                    errors += 1
+
+        # One request per PR first: these are the cold, uncached calls
+        calls = upstream_calls()
+        await asyncio.gather(*[call(i) for i in range(min(pr_count, requests))])
+        cold = upstream_calls() - calls
+        warmup = len(latencies)
+
+        calls = upstream_calls()
+        start = time.perf_counter()
+        await asyncio.gather(*[call(i) for i in range(requests)])
+        elapsed = time.perf_counter() - start
+        steady = upstream_calls() - calls
+
+    measured = [t * 1000 for t in latencies[warmup:]]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(measured, 0.5), 1),
+        "p99_ms": round(percentile(measured, 0.99), 1),
+        "throughput": round(requests / elapsed, 1),
+        "cold_upstream_per_request": round(cold / warmup, 1),
+        "steady_upstream_per_request": round(steady / requests, 2),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for endpoint, result in results.items():
+        before = baseline.get(endpoint)
+        if not before:
+            continue
+        for key, direction in COMPARED.items():
+            old, new = before.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            if change > tolerance:
+                found.append(f"{endpoint}: {key} {old} -> {new}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=SCENARIOS, default="small")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="GitHub stub latency in seconds")
+    parser.add_argument("--groq-latency", type=float, default=0.5)
+    parser.add_argument("--rate-limit", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--github-port", type=int, default=8771)
+    parser.add_argument("--groq-port", type=int, default=8772)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    shape = SCENARIOS[args.scenario]
+    github = create_app(latency=args.latency, rate_limit=args.rate_limit, **shape)
+    groq = stub_groq.create_app(latency=args.groq_latency)
+    serve_in_thread(github, args.github_port)
+    serve_in_thread(groq, args.groq_port)
+
+    results = {}
+    print(f"scenario {args.scenario}: {shape}")
+    print(f"{'endpoint':<24}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>8}{'errors':>8}{'cold up/req':>13}{'steady up/req':>15}{'peak RSS MB':>13}")
+    for endpoint in args.endpoints.split(","):
+        with tempfile.TemporaryDirectory() as workdir:
+            proc = start_backend(args.port, f"http://127.0.0.1:{args.github_port}", f"http://127.0.0.1:{args.groq_port}", workdir)
+            try:
+                result = asyncio.run(drive(args.port, endpoint, args.requests, args.concurrency, shape["pr_count"], [github, groq]))
+                result["peak_rss_mb"] = peak_rss_mb(proc.pid)
+            finally:
+                proc.terminate()
+                proc.wait()
+        results[endpoint] = result
+        print(
+            f"{endpoint:<24}{result['p50_ms']:>9}{result['p99_ms']:>9}{result['throughput']:>8}{result['errors']:>8}"
+            f"{result['cold_upstream_per_request']:>13}{result['steady_upstream_per_request']:>15}{str(result['peak_rss_mb']):>13}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scenario": args.scenario, "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f)["results"], args.tolerance)
+        for line in found:
+            print("REGRESSION", line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
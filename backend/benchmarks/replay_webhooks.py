@@ -0,0 +1,133 @@
+"""
+Replays recorded webhook deliveries into the backend and checks that the read
+endpoints are then served from the local PR index, with GitHub only asked to
+revalidate the caller's repo access. Run from the backend directory:
+
+    python -m benchmarks.replay_webhooks --recording benchmarks/webhooks/sample.jsonl
+
+Each recording line is {"event": "<X-GitHub-Event>", "payload": {...}}.
+For the bundled recording the resulting index state is checked too, and the
+exit status is 1 when any check fails.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+import httpx
+from benchmarks.stub_github import create_app, serve_in_thread
+
+SECRET = "bench-secret"
+SAMPLE = os.path.join(os.path.dirname(__file__), "webhooks", "sample.jsonl")
+
+
+async def check_sample(client, params):
+    """What the bundled recording must leave behind; returns the failed checks."""
+    failed = []
+
+    def check(ok, what):
+        if not ok:
+            failed.append(what)
+
+    prs = {pr["number"]: pr for pr in (await client.get("/api/list-prs", params=params)).json()["prs"]}
+    check(2 not in prs, "PR 2 is closed")
+    check(prs.get(6, {}).get("head_sha") == "a" * 40, "PR 6 head moved to aaaa... by synchronize")
+    check(prs.get(6, {}).get("commit_count") == 2, "PR 6 has 2 commits")
+    # A push to the base repo's main must not touch the fork PR whose branch is also main
+    check(prs.get(9, {}).get("head_sha") == "9" * 40, "fork PR 9 keeps head 9999...")
+    status = (await client.get("/api/pr-status", params={**params, "pr_number": 6})).json()
+    check(status.get("state") == "success", "PR 6 combined status is success")
+    check([c["description"] for c in status.get("checks", [])] == ["Build passed"], "PR 6 has only the new head's status")
+    checks = (await client.get("/api/pr-check-summaries", params={**params, "pr_number": 6})).json()["checks"]
+    check([(c["title"], c["status"]) for c in checks] == [("lint", "success")], "PR 6 lint check run succeeded")
+    status = (await client.get("/api/pr-status", params={**params, "pr_number": 9})).json()
+    check(status.get("state") == "pending" and status.get("checks") == [], "PR 9 has no statuses yet")
+    return failed
+
+
+async def read_endpoints(client, params, pr_numbers):
+    start = time.perf_counter()
+    prs = (await client.get("/api/list-prs", params=params)).json()["prs"]
+    for number in pr_numbers:
+        for path in ("/api/pr-status", "/api/pr-check-summaries"):
+            (await client.get(path, params={**params, "pr_number": number})).raise_for_status()
+    return prs, time.perf_counter() - start
+
+
+async def deliver(client, event, payload):
+    body = json.dumps(payload).encode()
+    signature = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    resp = await client.post("/webhooks/github", content=body, headers={
+        "X-GitHub-Event": event,
+        "X-Hub-Signature-256": signature,
+        "Content-Type": "application/json",
+    })
+    resp.raise_for_status()
+
+
+async def run(recording, port, stub):
+    os.environ["GITHUB_API_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["GITHUB_WEBHOOK_SECRET"] = SECRET
+    os.environ["PR_INDEX_PATH"] = os.path.join(tempfile.mkdtemp(), "pr_index.sqlite3")
+    for name in ("GITHUB_CLIENT_ID", "GITHUB_CLIENT_SECRET", "OAUTH_CALLBACK_URL", "GROQ_API_KEY"):
+        os.environ.setdefault(name, "bench")
+    os.environ.setdefault("GITHUB_CACHE_TTL", "0")
+    import main
+
+    with open(recording) as f:
+        deliveries = [json.loads(line) for line in f if line.strip()]
+
+    await main.session_store.set("bench", "bench-token")
+    params = {"repo_url": "https://github.com/octo/repo", "state": "bench"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client:
+        prs, _ = await read_endpoints(client, params, [])
+        numbers = [pr["number"] for pr in prs]
+        calls = stub.state.calls
+        _, live = await read_endpoints(client, params, numbers)
+        live_calls = stub.state.calls - calls
+
+        # GitHub sends a ping when the hook is created; the next reads seed the index
+        await deliver(client, "ping", {"zen": "Keep it logically awesome.", "repository": {"full_name": "octo/repo"}})
+        await read_endpoints(client, params, numbers)
+        for delivery in deliveries:
+            await deliver(client, delivery["event"], delivery["payload"])
+
+        calls = stub.state.calls
+        prs, _ = await read_endpoints(client, params, [])
+        numbers = [pr["number"] for pr in prs]
+        _, indexed = await read_endpoints(client, params, numbers)
+        indexed_calls = stub.state.calls - calls
+        failed = await check_sample(client, params) if os.path.samefile(recording, SAMPLE) else []
+    await main.close_pools()
+
+    print(f"replayed deliveries:        {len(deliveries):8d}")
+    print(f"open PRs after replay:      {numbers}")
+    print(f"live reads:                 {live * 1000:8.1f} ms, {live_calls} upstream calls")
+    print(f"indexed reads:              {indexed * 1000:8.1f} ms, {indexed_calls} upstream calls")
+    # Indexed reads may only revalidate repo access: at most one call per request
+    if indexed_calls > 2 + 2 * len(numbers):
+        failed.append(f"indexed reads made {indexed_calls} upstream calls")
+    for what in failed:
+        print("FAILED", what)
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recording", default=SAMPLE)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    stub = create_app(latency=args.latency)
+    serve_in_thread(stub, args.port)
+    if not asyncio.run(run(args.recording, args.port, stub)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
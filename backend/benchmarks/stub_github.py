@@ -0,0 +1,206 @@
+"""
+Minimal stand-in for the GitHub REST and GraphQL APIs, used by the benchmarks.
+Every route sleeps for `latency` seconds so blocking behaviour in the
+backend shows up as serialized wall-clock time. List endpoints paginate with
+Link headers like GitHub, and every response carries rate-limit headers.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency=0.2, pr_count=5, commits_per_pr=3, files_per_commit=2, rate_limit=5000,
+               check_runs_per_commit=0, annotations_per_run=0, pr_files=None, patch_lines=1,
+               rate_limit_window=3600):
+    """
+    `pr_files` is the number of files a PR's /files listing returns (defaults
+    to `files_per_commit`) and `patch_lines` the changed lines per file patch.
+    The rate-limit budget refills every `rate_limit_window` seconds.
+    """
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.remaining = rate_limit
+    app.state.reset = int(time.time()) + rate_limit_window
+    pr_files = files_per_commit if pr_files is None else pr_files
+
+    def patch(name):
+        return "@@ -1,%d +1,%d @@\n" % (patch_lines, patch_lines) + "".join(
+            f"-old line {i} of {name}\n+new line {i} of {name}\n" for i in range(patch_lines)
+        )
+
+    @app.middleware("http")
+    async def delay(request: Request, call_next):
+        app.state.calls += 1
+        await asyncio.sleep(latency)
+        if time.time() >= app.state.reset:
+            app.state.remaining = rate_limit
+            app.state.reset = int(time.time()) + rate_limit_window
+        limits = {
+            "X-RateLimit-Limit": str(rate_limit),
+            "X-RateLimit-Remaining": str(max(app.state.remaining - 1, 0)),
+            "X-RateLimit-Reset": str(app.state.reset),
+        }
+        if app.state.remaining <= 0:
+            return Response('{"message": "API rate limit exceeded"}', status_code=403, headers=limits)
+        app.state.remaining -= 1
+        response = await call_next(request)
+        response.headers.update(limits)
+        if request.method != "GET" or response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag, **limits})
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+        headers["ETag"] = etag
+        return Response(body, status_code=200, headers=headers)
+
+    def page(request, items):
+        """Slices `items` by ?page/&per_page and adds a GitHub-style Link header for the next page."""
+        per_page = int(request.query_params.get("per_page", 30))
+        number = int(request.query_params.get("page", 1))
+        start = (number - 1) * per_page
+        headers = {}
+        if start + per_page < len(items):
+            headers["Link"] = '<%s>; rel="next"' % request.url.include_query_params(page=number + 1)
+        return items[start:start + per_page], headers
+
+    def pull(number):
+        return {
+            "number": number,
+            "title": f"PR {number}",
+            "user": {"login": "octocat"},
+            "body": "",
+            "html_url": f"https://github.com/octo/repo/pull/{number}",
+            "commits": commits_per_pr,
+            "head": {"sha": f"{number:040x}", "ref": f"branch-{number}"},
+            "base": {"sha": "b" * 40, "ref": "main"},
+            "labels": [{"name": "bug" if number % 2 else "feature"}],
+            "updated_at": f"2024-01-{number % 28 + 1:02d}T00:00:00Z",
+        }
+
+    @app.post("/graphql")
+    async def graphql(request: Request):
+        variables = (await request.json()).get("variables", {})
+        start = int(variables.get("after") or 0)
+        end = min(start + variables.get("first", 100), pr_count)
+        nodes = [
+            {
+                "number": n,
+                "title": f"PR {n}",
+                "author": {"login": "octocat"},
+                "body": "",
+                "url": f"https://github.com/octo/repo/pull/{n}",
+                "commits": {"totalCount": commits_per_pr},
+                "headRefOid": f"{n:040x}",
+                "headRefName": f"branch-{n}",
+                "labels": {"nodes": [{"name": "bug" if n % 2 else "feature"}]},
+                "updatedAt": f"2024-01-{n % 28 + 1:02d}T00:00:00Z",
+            }
+            for n in range(start + 1, end + 1)
+        ]
+        page_info = {"hasNextPage": end < pr_count, "endCursor": str(end)}
+        return {"data": {"repository": {"pullRequests": {"pageInfo": page_info, "nodes": nodes}}}}
+
+    @app.post("/login/oauth/access_token")
+    async def access_token():
+        return {"access_token": "stub-token", "token_type": "bearer", "scope": "repo"}
+
+    @app.get("/user")
+    async def user():
+        return {"login": "octocat", "name": "Octo Cat", "avatar_url": ""}
+
+    @app.get("/repos/{owner}/{repo}")
+    async def get_repo(owner: str, repo: str):
+        return {"full_name": f"{owner}/{repo}", "private": True, "default_branch": "main"}
+
+    @app.get("/repos/{owner}/{repo}/pulls")
+    async def pulls(owner: str, repo: str, request: Request):
+        items, headers = page(request, [pull(n) for n in range(1, pr_count + 1)])
+        return JSONResponse(items, headers=headers)
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}")
+    async def get_pull(owner: str, repo: str, number: int):
+        return pull(number)
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}/commits")
+    async def pull_commits(owner: str, repo: str, number: int, request: Request):
+        commits = [
+            {
+                "sha": f"{number:020x}{i:020x}",
+                "commit": {"message": f"commit {i}", "author": {"date": "2024-01-01T00:00:00Z"}},
+                "author": {"login": "octocat"},
+            }
+            for i in range(commits_per_pr)
+        ]
+        items, headers = page(request, commits)
+        return JSONResponse(items, headers=headers)
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}/files")
+    async def pull_files(owner: str, repo: str, number: int, request: Request):
+        items, headers = page(request, [{"filename": f"file{i}.py", "patch": patch(f"file{i}.py")} for i in range(pr_files)])
+        return JSONResponse(items, headers=headers)
+
+    @app.post("/repos/{owner}/{repo}/pulls/{number}/reviews")
+    async def create_review(owner: str, repo: str, number: int):
+        return {"id": 1, "state": "APPROVED"}
+
+    @app.get("/repos/{owner}/{repo}/commits/{sha}")
+    async def commit(owner: str, repo: str, sha: str):
+        return {
+            "sha": sha,
+            "files": [{"filename": f"file{i}.py", "patch": patch(f"file{i}.py")} for i in range(files_per_commit)],
+        }
+
+    @app.get("/repos/{owner}/{repo}/commits/{sha}/status")
+    async def status(owner: str, repo: str, sha: str):
+        return {"state": "success", "statuses": []}
+
+    @app.get("/repos/{owner}/{repo}/commits/{sha}/check-runs")
+    async def check_runs(owner: str, repo: str, sha: str, request: Request):
+        runs = [
+            {
+                "id": i + 1,
+                "name": f"check {i}",
+                "head_sha": sha,
+                "status": "completed",
+                "conclusion": "failure" if annotations_per_run else "success",
+                "details_url": f"https://ci.example.com/runs/{i + 1}",
+                "output": {"summary": f"check {i} finished", "annotations_count": annotations_per_run},
+            }
+            for i in range(check_runs_per_commit)
+        ]
+        items, headers = page(request, runs)
+        return JSONResponse({"total_count": len(runs), "check_runs": items}, headers=headers)
+
+    @app.get("/repos/{owner}/{repo}/check-runs/{run_id}/annotations")
+    async def annotations(owner: str, repo: str, run_id: int, request: Request):
+        anns = [
+            {
+                "path": f"file{i % max(files_per_commit, 1)}.py",
+                "start_line": i + 1,
+                "end_line": i + 1,
+                "annotation_level": "warning",
+                "title": "lint",
+                "message": f"issue {i} in run {run_id}",
+            }
+            for i in range(annotations_per_run)
+        ]
+        items, headers = page(request, anns)
+        return JSONResponse(items, headers=headers)
+
+    return app
+
+
+def serve_in_thread(app, port):
+    """Starts `app` on 127.0.0.1:`port` in a daemon thread and waits until it accepts requests."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
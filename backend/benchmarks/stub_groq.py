@@ -0,0 +1,56 @@
+"""
+Minimal stand-in for the Groq chat-completions API, used by the benchmarks.
+Replies with a short fixed review after `latency` seconds. With
+`max_concurrency`, calls beyond that many in flight get a 429 with
+Retry-After, like Groq's rate limiter.
+"""
+import asyncio
+import json
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+
+
+def create_app(latency=0.5, max_concurrency=None, retry_after=0.1):
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.prompt_chars = 0
+    app.state.in_flight = 0
+    app.state.rejected = 0
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        app.state.calls += 1
+        if max_concurrency is not None and app.state.in_flight >= max_concurrency:
+            app.state.rejected += 1
+            return JSONResponse({"error": {"message": "Rate limit reached"}}, status_code=429,
+                                headers={"Retry-After": str(retry_after)})
+        app.state.in_flight += 1
+        app.state.prompt_chars += len(prompt)
+        content = f"- Reviewed {len(prompt)} characters."
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content.split())}
+        if body.get("stream"):
+            async def events():
+                try:
+                    words = content.split(" ")
+                    for i, word in enumerate(words):
+                        await asyncio.sleep(latency / len(words))
+                        token = word if i == 0 else " " + word
+                        yield "data: " + json.dumps({"choices": [{"delta": {"content": token}}]}) + "\n\n"
+                    yield "data: " + json.dumps({"choices": [{"delta": {}}], "x_groq": {"usage": usage}}) + "\n\n"
+                    yield "data: [DONE]\n\n"
+                finally:
+                    app.state.in_flight -= 1
+            return StreamingResponse(events(), media_type="text/event-stream")
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            app.state.in_flight -= 1
+        return {
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        }
+
+    return app
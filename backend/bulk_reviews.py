@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pr_reviews (
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    head_sha TEXT NOT NULL,
+    review TEXT NOT NULL,
+    diff_stats TEXT,
+    reviewed_at REAL NOT NULL,
+    PRIMARY KEY (repo, number, head_sha)
+);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    repo TEXT NOT NULL,
+    filters TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pid INTEGER,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS batch_prs (
+    batch_id TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    title TEXT,
+    head_sha TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    finished_at REAL,
+    PRIMARY KEY (batch_id, number)
+);
+"""
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def filter_prs(prs, label=None, author=None, updated_since=None):
+    """
+    Applies the bulk review filters to PR_FIELDS dicts. `updated_since` is an
+    ISO 8601 timestamp or date; GitHub timestamps are UTC and compare as strings.
+    PRs missing a filtered field don't match.
+    """
+    return [
+        pr for pr in prs
+        if (not label or label in (pr.get("labels") or []))
+        and (not author or pr.get("author") == author)
+        and (not updated_since or (pr.get("updated_at") or "") >= updated_since)
+    ]
+
+
+class BulkReviewStore:
+    """
+    SQLite record of bulk review batches and their per-PR progress, plus every
+    review they produced keyed by (repo, PR, head SHA), so later batches skip
+    PR heads that were already reviewed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # Batches run in the process that created them; ones whose process is gone will never finish
+            for batch_id, pid in db.execute("SELECT id, pid FROM batches WHERE status IN ('queued', 'running')").fetchall():
+                if pid == os.getpid() or not process_alive(pid):
+                    db.execute("UPDATE batches SET status = 'interrupted', finished_at = ? WHERE id = ?", (time.time(), batch_id))
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    def _create_batch(self, batch_id, repo, filters, prs):
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO batches (id, repo, filters, status, pid, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (batch_id, repo, json.dumps(filters), os.getpid(), time.time()),
+            )
+            db.executemany(
+                "INSERT INTO batch_prs (batch_id, number, title, head_sha, status) VALUES (?, ?, ?, ?, 'pending')",
+                [(batch_id, pr["number"], pr["title"], pr["head_sha"]) for pr in prs],
+            )
+
+    async def create_batch(self, batch_id, repo, filters, prs):
+        await self._run(self._create_batch, batch_id, repo, filters, prs)
+
+    def _set_batch_status(self, batch_id, status):
+        finished_at = time.time() if status not in ("queued", "running") else None
+        with self._connect() as db:
+            db.execute("UPDATE batches SET status = ?, finished_at = ? WHERE id = ?", (status, finished_at, batch_id))
+
+    async def set_batch_status(self, batch_id, status):
+        await self._run(self._set_batch_status, batch_id, status)
+
+    def _set_pr_status(self, batch_id, number, status, error=None):
+        finished_at = time.time() if status not in ("pending", "running") else None
+        with self._connect() as db:
+            db.execute(
+                "UPDATE batch_prs SET status = ?, error = ?, finished_at = ? WHERE batch_id = ? AND number = ?",
+                (status, error, finished_at, batch_id, number),
+            )
+
+    async def set_pr_status(self, batch_id, number, status, error=None):
+        await self._run(self._set_pr_status, batch_id, number, status, error)
+
+    def _has_review(self, repo, number, head_sha):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT 1 FROM pr_reviews WHERE repo = ? AND number = ? AND head_sha = ?", (repo, number, head_sha)
+            ).fetchone()
+        return row is not None
+
+    async def has_review(self, repo, number, head_sha):
+        return await self._run(self._has_review, repo, number, head_sha)
+
+    def _save_review(self, repo, number, head_sha, review, diff_stats):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO pr_reviews (repo, number, head_sha, review, diff_stats, reviewed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (repo, number, head_sha, review, json.dumps(diff_stats), time.time()),
+            )
+
+    async def save_review(self, repo, number, head_sha, review, diff_stats=None):
+        await self._run(self._save_review, repo, number, head_sha, review, diff_stats)
+
+    def _batch(self, batch_id, include_reviews):
+        with self._connect() as db:
+            batch = db.execute(
+                "SELECT repo, filters, status, created_at, finished_at FROM batches WHERE id = ?", (batch_id,)
+            ).fetchone()
+            if batch is None:
+                return None
+            repo, filters, status, created_at, finished_at = batch
+            rows = db.execute(
+                "SELECT p.number, p.title, p.head_sha, p.status, p.error, r.review, r.diff_stats FROM batch_prs p"
+                " LEFT JOIN pr_reviews r ON r.repo = ? AND r.number = p.number AND r.head_sha = p.head_sha"
+                " WHERE p.batch_id = ? ORDER BY p.number DESC",
+                (repo, batch_id),
+            ).fetchall()
+        prs = []
+        counts = {"pending": 0, "running": 0, "done": 0, "skipped": 0, "error": 0}
+        for number, title, head_sha, pr_status, error, review, diff_stats in rows:
+            counts[pr_status] += 1
+            pr = {"number": number, "title": title, "head_sha": head_sha, "status": pr_status, "error": error}
+            if include_reviews:
+                pr["review"] = review
+                pr["diff_stats"] = json.loads(diff_stats) if diff_stats else None
+            prs.append(pr)
+        return {
+            "batch_id": batch_id,
+            "repo": repo,
+            "filters": json.loads(filters),
+            "status": status,
+            "created_at": created_at,
+            "finished_at": finished_at,
+            "total": len(prs),
+            "progress": counts,
+            "prs": prs,
+        }
+
+    async def batch(self, batch_id, include_reviews=False):
+        """Progress of a batch, optionally with the stored reviews; None if unknown."""
+        return await self._run(self._batch, batch_id, include_reviews)
@@ -0,0 +1,114 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    __slots__ = ("data", "links", "etag", "last_modified", "stored_at")
+
+    def __init__(self, data, links=None, etag=None, last_modified=None):
+        self.data = data
+        self.links = links or {}
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.monotonic()
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    LRU cache of GitHub responses keyed by (token, URL).
+    Entries younger than `ttl` seconds are served without a request; older ones
+    keep their ETag/Last-Modified so they can be revalidated with a conditional
+    request, which GitHub does not count against the rate limit when it returns 304.
+    """
+
+    def __init__(self, ttl=30, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token, url):
+        # Never keep raw tokens around as dictionary keys
+        return hashlib.sha256(token.encode()).hexdigest()[:16], url
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def is_fresh(self, entry):
+        return time.monotonic() - entry.stored_at < self.ttl
+
+    def put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def touch(self, key, entry):
+        """
+        Marks an entry as fresh again after a 304 Not Modified. The entry is put
+        back, since other requests may have evicted it while this one was in flight.
+        """
+        entry.stored_at = time.monotonic()
+        self.put(key, entry)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.revalidated) / lookups, 3) if lookups else 0.0,
+        }
+
+
+class LRUCache:
+    """Plain size-bounded LRU map for immutable values (e.g. commits by SHA)."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
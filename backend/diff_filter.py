@@ -0,0 +1,221 @@
+"""
+Pre-review diff pipeline: drops or summarizes low-value files and compacts
+the rest before prompts are built. Works file by file over an async stream of
+GitHub file objects, so a PR's full file list is never held in memory.
+"""
+import hashlib
+import os
+from fnmatch import fnmatch
+
+
+def setting_globs(name, default):
+    return [g.strip() for g in os.environ.get(name, default).split(",") if g.strip()]
+
+
+# Files left out of the prompt entirely
+REVIEW_DROP_GLOBS = setting_globs("REVIEW_DROP_GLOBS", "*.snap,*.svg,*.map,*.ipynb")
+# Files replaced by a one-line note with their size, e.g. lockfiles, vendored and generated code
+REVIEW_SUMMARIZE_GLOBS = setting_globs(
+    "REVIEW_SUMMARIZE_GLOBS",
+    "package-lock.json,yarn.lock,pnpm-lock.yaml,poetry.lock,Pipfile.lock,Cargo.lock,Gemfile.lock,composer.lock,go.sum,"
+    "vendor/*,*/vendor/*,node_modules/*,third_party/*,dist/*,build/*,"
+    "*.min.js,*.min.css,*_pb2.py,*.pb.go,*.generated.*",
+)
+# Files where indentation is syntax, so whitespace changes are never summarized away
+INDENT_SENSITIVE_GLOBS = setting_globs(
+    "REVIEW_INDENT_SENSITIVE_GLOBS", "*.py,*.pyi,*.yaml,*.yml,Makefile,*.mk,*.haml,*.pug,*.sass,*.coffee"
+)
+# Lines longer than this mark a file as minified
+MINIFIED_LINE_CHARS = int(os.environ.get("REVIEW_MINIFIED_LINE_CHARS", "1000"))
+# Unchanged lines kept on each side of a change when longer context runs are collapsed
+CONTEXT_LINES = int(os.environ.get("REVIEW_CONTEXT_LINES", "3"))
+# Hunks smaller than this many tokens are not worth replacing with a back-reference
+DEDUP_MIN_TOKENS = 20
+
+# Part of the review cache key: changing the filter changes the prompts
+CONFIG_VERSION = repr((REVIEW_DROP_GLOBS, REVIEW_SUMMARIZE_GLOBS, INDENT_SENSITIVE_GLOBS, MINIFIED_LINE_CHARS, CONTEXT_LINES))
+
+
+def estimate_tokens(text):
+    # Roughly 4 characters per token for code and English prose
+    return len(text) // 4 + 1
+
+
+def matches(filename, globs):
+    basename = filename.rsplit("/", 1)[-1]
+    return any(fnmatch(filename, g) or fnmatch(basename, g) for g in globs)
+
+
+def changed_lines(patch):
+    removed, added = [], []
+    for line in patch.splitlines():
+        if line.startswith("-"):
+            removed.append(line[1:])
+        elif line.startswith("+"):
+            added.append(line[1:])
+    return removed, added
+
+
+def spacing_normalized(line):
+    """Collapses runs of whitespace after the indentation and drops trailing whitespace; indentation is kept."""
+    indent = line[:len(line) - len(line.lstrip())]
+    return indent + " ".join(line.split())
+
+
+def whitespace_only(filename, removed, added):
+    # Compared line by line in order, so moved or re-indented lines still count as changes
+    if matches(filename, INDENT_SENSITIVE_GLOBS):
+        return False
+    return [spacing_normalized(l) for l in removed] == [spacing_normalized(l) for l in added]
+
+
+def classify(file):
+    """Returns (action, reason): action is "keep", "summarize" or "drop"."""
+    filename = file["filename"]
+    patch = file.get("patch")
+    if matches(filename, REVIEW_DROP_GLOBS):
+        return "drop", "excluded"
+    if matches(filename, REVIEW_SUMMARIZE_GLOBS):
+        return "summarize", "lockfile, vendored or generated"
+    if not patch:
+        # GitHub omits the patch for binary files and very large diffs
+        return "summarize", "renamed" if file.get("status") == "renamed" else "binary or too large"
+    removed, added = changed_lines(patch)
+    if not removed and not added:
+        return "summarize", "renamed" if file.get("status") == "renamed" else "no line changes"
+    if any(len(line) > MINIFIED_LINE_CHARS for line in added):
+        return "summarize", "minified"
+    if whitespace_only(filename, removed, added):
+        return "summarize", "whitespace only"
+    return "keep", None
+
+
+def summary_note(file, reason):
+    if reason == "renamed":
+        return f"(renamed from {file.get('previous_filename', 'unknown')}, no line changes)"
+    removed, added = changed_lines(file.get("patch") or "")
+    additions = file.get("additions", len(added))
+    deletions = file.get("deletions", len(removed))
+    note = f"({reason}: +{additions} -{deletions} lines, diff omitted)"
+    if file.get("previous_filename"):
+        note = f"(renamed from {file['previous_filename']}) {note}"
+    return note
+
+
+def collapse_context(hunk, keep=None):
+    """
+    Shortens runs of unchanged lines to `keep` lines next to each change.
+    Returns (hunk, number of lines removed).
+    """
+    keep = CONTEXT_LINES if keep is None else keep
+    lines = hunk.splitlines(keepends=True)
+    out = []
+    collapsed = 0
+    i = 0
+    while i < len(lines):
+        if not lines[i].startswith(" "):
+            out.append(lines[i])
+            i += 1
+            continue
+        j = i
+        while j < len(lines) and lines[j].startswith(" "):
+            j += 1
+        run = lines[i:j]
+        # Context matters only next to a change: after the previous one, before the next one
+        head = run[:keep] if i > 0 and not lines[i - 1].startswith("@@") else []
+        tail = run[-keep:] if j < len(lines) and keep else []
+        skipped = len(run) - len(head) - len(tail)
+        if skipped > 1:
+            out.extend(head)
+            out.append(f" ... {skipped} unchanged lines ...\n")
+            out.extend(tail)
+            collapsed += skipped
+        else:
+            out.extend(run)
+        i = j
+    return "".join(out), collapsed
+
+
+def split_hunks(patch):
+    """Splits a unified diff patch at its @@ hunk headers."""
+    hunks = []
+    current = []
+    for line in patch.splitlines(keepends=True):
+        if line.startswith("@@") and current:
+            hunks.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        hunks.append("".join(current))
+    return hunks
+
+
+class DiffStats:
+    """What the pipeline did to one review's diff, and the tokens it saved."""
+
+    def __init__(self):
+        self.files = 0
+        self.kept = 0
+        self.summarized = {}
+        self.dropped = {}
+        self.collapsed_lines = 0
+        self.duplicate_hunks = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def to_dict(self):
+        return {
+            "files": self.files,
+            "kept": self.kept,
+            "summarized": self.summarized,
+            "dropped": self.dropped,
+            "collapsed_lines": self.collapsed_lines,
+            "duplicate_hunks": self.duplicate_hunks,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+        }
+
+
+def compact_patch(filename, patch, seen, stats):
+    """Collapses long unchanged context and replaces hunks already seen in another file."""
+    out = []
+    for hunk in split_hunks(patch):
+        header, _, body = hunk.partition("\n")
+        digest = hashlib.sha1(body.encode()).hexdigest()
+        if digest in seen and estimate_tokens(body) >= DEDUP_MIN_TOKENS:
+            stats.duplicate_hunks += 1
+            out.append(f"{header}\n (same change as in {seen[digest]})\n")
+            continue
+        seen.setdefault(digest, filename)
+        hunk, collapsed = collapse_context(hunk)
+        stats.collapsed_lines += collapsed
+        out.append(hunk)
+    return "".join(out)
+
+
+async def prefilter(files, stats=None):
+    """
+    Async generator over GitHub file objects (dicts with filename, patch,
+    status, ...) that yields (filename, patch) pairs ready for chunking.
+    Only hunk digests are kept between files, for deduplication.
+    """
+    stats = stats if stats is not None else DiffStats()
+    seen = {}
+    async for file in files:
+        stats.files += 1
+        filename = file["filename"]
+        patch = file.get("patch") or ""
+        stats.tokens_before += estimate_tokens(patch)
+        action, reason = classify(file)
+        if action == "drop":
+            stats.dropped[reason] = stats.dropped.get(reason, 0) + 1
+            continue
+        if action == "summarize":
+            stats.summarized[reason] = stats.summarized.get(reason, 0) + 1
+            patch = summary_note(file, reason)
+        else:
+            stats.kept += 1
+            patch = compact_patch(filename, patch, seen, stats)
+        stats.tokens_after += estimate_tokens(patch)
+        yield filename, patch
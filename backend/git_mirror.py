@@ -0,0 +1,312 @@
+"""
+Optional bare git mirrors of reviewed repositories. Commit lists and diffs are
+computed locally instead of with one REST call per commit, and patches are
+never truncated the way GitHub truncates large files. Mirrors are fetched
+incrementally (only the PR and base refs, and only when a SHA is missing) and
+evicted least recently used once they take more than GIT_MIRROR_MAX_BYTES.
+"""
+import asyncio
+import base64
+import os
+import re
+import shutil
+from contextlib import asynccontextmanager
+
+# Unset disables the mirror and every diff comes from the REST API
+GIT_MIRROR_DIR = os.environ.get("GIT_MIRROR_DIR", "")
+GIT_MIRROR_MAX_BYTES = int(os.environ.get("GIT_MIRROR_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+# Fetch URL; {owner_repo} is filled in, so a path like /srv/git/{owner_repo}.git mirrors local repositories
+GIT_MIRROR_REMOTE = os.environ.get(
+    "GIT_MIRROR_REMOTE", os.environ.get("GITHUB_WEB_URL", "https://github.com") + "/{owner_repo}.git"
+)
+GIT_TIMEOUT = float(os.environ.get("GIT_TIMEOUT", "300"))
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+# git diff --raw status letter -> GitHub file status
+FILE_STATUS = {"A": "added", "D": "removed", "M": "modified", "T": "changed", "R": "renamed", "C": "copied"}
+_OWNER_REPO = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*/[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+
+class GitError(Exception):
+    pass
+
+
+def git_env(remote, token):
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    if token and remote.startswith(("http://", "https://")):
+        # Passed through the environment so the token never shows up in argv or the mirror's config
+        basic = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update({
+            "GIT_CONFIG_COUNT": "1",
+            "GIT_CONFIG_KEY_0": "http.extraHeader",
+            "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}",
+        })
+    return env
+
+
+async def run_git(*args, cwd=None, env=None, input=None):
+    """Runs git and returns its stdout as bytes; raises GitError on failure or timeout."""
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args,
+        cwd=cwd,
+        env=env,
+        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(input), GIT_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise GitError(f"git {args[0]} failed: {err.decode(errors='replace').strip()}")
+    return out
+
+
+async def git_lines(*args, cwd=None):
+    """Yields git's stdout line by line (bytes, without newlines) while it runs."""
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args,
+        cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        # Read in blocks: minified files have lines far beyond StreamReader's line limit
+        buffer = b""
+        while True:
+            block = await proc.stdout.read(65536)
+            if not block:
+                break
+            buffer += block
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line
+        if buffer:
+            yield buffer
+        if await proc.wait() != 0:
+            raise GitError(f"git {args[0]} failed with status {proc.returncode}")
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
+def parse_raw_numstat(out):
+    """
+    Parses `git diff -z --raw --numstat` into GitHub-style file dicts (without
+    patches), in git's diff order.
+    """
+    tokens = out.decode(errors="replace").split("\0")
+    files = []
+    i = 0
+    while i < len(tokens) and tokens[i].startswith(":"):
+        status = tokens[i].split()[-1][0]
+        file = {"filename": tokens[i + 1], "status": FILE_STATUS.get(status, "modified")}
+        i += 2
+        if status in "RC":
+            file["previous_filename"] = file["filename"]
+            file["filename"] = tokens[i]
+            i += 1
+        files.append(file)
+    for file in files:
+        added, deleted, path = tokens[i].split("\t", 2)
+        # Renames list the paths as two extra tokens
+        i += 3 if not path else 1
+        if added != "-":
+            file["additions"], file["deletions"] = int(added), int(deleted)
+        else:
+            file["additions"], file["deletions"] = 0, 0
+        file["changes"] = file["additions"] + file["deletions"]
+    return files
+
+
+def dir_size(path):
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class GitMirror:
+    """Bare mirrors under `root`, one per repository, as <owner>/<repo>.git."""
+
+    def __init__(self, root, max_bytes=GIT_MIRROR_MAX_BYTES, remote=GIT_MIRROR_REMOTE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.remote = remote
+        self.locks = {}
+        self.active = {}
+        self.sizes = None
+        self.fetches = 0
+        self.up_to_date = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, owner_repo):
+        if not _OWNER_REPO.match(owner_repo):
+            raise ValueError(f"Invalid repository: {owner_repo}")
+        return os.path.join(self.root, owner_repo + ".git")
+
+    @asynccontextmanager
+    async def use(self, owner_repo):
+        """Marks the mirror as in use, so eviction leaves it alone."""
+        path = self.path(owner_repo)
+        self.active[path] = self.active.get(path, 0) + 1
+        try:
+            yield path
+        finally:
+            self.active[path] -= 1
+            if not self.active[path]:
+                del self.active[path]
+
+    async def missing(self, path, shas):
+        out = await run_git("cat-file", "--batch-check", cwd=path, input="".join(f"{sha}^{{commit}}\n" for sha in shas).encode())
+        return [sha for sha, line in zip(shas, out.decode().splitlines()) if line.endswith(" missing")]
+
+    async def sync(self, owner_repo, token, pr):
+        """
+        Makes sure the mirror has the PR's head and base commits, fetching only
+        the PR and base refs when one is missing. `pr` is the REST pull object.
+        Returns the base to diff against.
+        """
+        number = pr["number"]
+        head_sha, base_sha, base_ref = pr["head"]["sha"], pr["base"]["sha"], pr["base"]["ref"]
+        async with self.use(owner_repo) as path:
+            lock = self.locks.setdefault(path, asyncio.Lock())
+            async with lock:
+                if not os.path.isdir(path):
+                    await run_git("init", "--quiet", "--bare", path)
+                if await self.missing(path, [head_sha, base_sha]):
+                    remote = self.remote.format(owner_repo=owner_repo)
+                    await run_git(
+                        "fetch", "--quiet", "--no-tags", remote,
+                        f"+refs/pull/{number}/head:refs/pull/{number}/head",
+                        f"+refs/heads/{base_ref}:refs/heads/{base_ref}",
+                        cwd=path, env=git_env(remote, token),
+                    )
+                    self.fetches += 1
+                    if await self.missing(path, [head_sha]):
+                        raise GitError(f"{owner_repo}: head {head_sha} not found after fetch")
+                    if self.sizes is not None:
+                        self.sizes[path] = await asyncio.to_thread(dir_size, path)
+                else:
+                    self.up_to_date += 1
+                os.utime(path)
+                # A force-pushed base branch may no longer contain the recorded base SHA
+                base = f"refs/heads/{base_ref}" if await self.missing(path, [base_sha]) else base_sha
+            # Still marked in use, so the mirror the caller is about to read is never the one evicted
+            await self.evict()
+        return base
+
+    async def evict(self):
+        """Removes least recently used mirrors not in use until the total fits in max_bytes."""
+        if self.sizes is None:
+            self.sizes = await asyncio.to_thread(self.scan)
+        mirrors = [(os.stat(path).st_mtime, path) for path in self.sizes if os.path.isdir(path)]
+        self.sizes = {path: self.sizes[path] for _, path in mirrors}
+        total = sum(self.sizes.values())
+        for _, path in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if path in self.active or (path in self.locks and self.locks[path].locked()):
+                continue
+            await asyncio.to_thread(shutil.rmtree, path, True)
+            total -= self.sizes.pop(path)
+            self.locks.pop(path, None)
+            self.evictions += 1
+
+    def scan(self):
+        sizes = {}
+        for owner in os.listdir(self.root):
+            owner_dir = os.path.join(self.root, owner)
+            if not os.path.isdir(owner_dir):
+                continue
+            for name in os.listdir(owner_dir):
+                if name.endswith(".git"):
+                    sizes[os.path.join(owner_dir, name)] = dir_size(os.path.join(owner_dir, name))
+        return sizes
+
+    async def diff_files(self, path, old, new):
+        """
+        Yields GitHub-style file dicts (filename, status, additions, deletions,
+        patch, ...) for `git diff old new`, one file at a time. Binary files
+        have no patch, like on GitHub.
+        """
+        files = parse_raw_numstat(await run_git("diff", "-z", "--raw", "--numstat", "-M", old, new, cwd=path))
+        index = -1
+        patch = None
+
+        def finish():
+            file = files[index]
+            if patch:
+                file["patch"] = b"\n".join(patch).decode(errors="replace")
+            return file
+
+        async for line in git_lines("diff", "-M", "--no-color", "--no-ext-diff", old, new, cwd=path):
+            if line.startswith(b"diff --git "):
+                if index >= 0:
+                    yield finish()
+                index += 1
+                patch = None
+            elif patch is not None:
+                patch.append(line)
+            elif line.startswith(b"@@"):
+                # GitHub patches start at the first hunk header
+                patch = [line]
+        if index >= 0:
+            yield finish()
+
+    async def iter_commits(self, owner_repo, base, head):
+        """
+        Yields (commit, files) for each commit in base..head, oldest first.
+        Commits are shaped like REST commit objects; files like get_commit_files.
+        """
+        async with self.use(owner_repo) as path:
+            out = await run_git("log", "-z", "--reverse", "--format=%H%x1f%P%x1f%an%x1f%ae%x1f%aI%x1f%B", f"{base}..{head}", cwd=path)
+            for record in out.decode(errors="replace").split("\0"):
+                if not record:
+                    continue
+                sha, parents, name, email, date, message = record.split("\x1f", 5)
+                parents = parents.split()
+                commit = {
+                    "sha": sha,
+                    "commit": {"message": message.rstrip("\n"), "author": {"name": name, "email": email, "date": date}},
+                    "author": None,
+                    "parents": [{"sha": p} for p in parents],
+                }
+                files = [
+                    {"filename": f["filename"], "patch": f.get("patch", "(No patch available)")}
+                    async for f in self.diff_files(path, parents[0] if parents else EMPTY_TREE, sha)
+                ]
+                yield commit, files
+
+    async def iter_pr_files(self, owner_repo, base, head):
+        """Yields the PR's changed files, diffed from the merge base like GitHub's PR files."""
+        async with self.use(owner_repo) as path:
+            merge_base = (await run_git("merge-base", base, head, cwd=path)).decode().strip()
+            async for file in self.diff_files(path, merge_base, head):
+                yield file
+
+    def stats(self):
+        sizes = self.sizes or {}
+        return {
+            "mirrors": len(sizes),
+            "bytes": sum(sizes.values()),
+            "max_bytes": self.max_bytes,
+            "fetches": self.fetches,
+            "up_to_date": self.up_to_date,
+            "evictions": self.evictions,
+        }
+
+
+def create_git_mirror():
+    """The mirror configured by GIT_MIRROR_DIR, or None when the mode is off."""
+    return GitMirror(GIT_MIRROR_DIR) if GIT_MIRROR_DIR else None
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+import httpx
+from cache import CacheEntry, LRUCache, ResponseCache
+from http_pools import get_pool
+from rate_limit import INTERACTIVE, scheduler
+
+response_cache = ResponseCache(
+    ttl=float(os.environ.get("GITHUB_CACHE_TTL", "30")),
+    max_entries=int(os.environ.get("GITHUB_CACHE_SIZE", "1024")),
+)
+# Commits are immutable, so their file lists are memoized by (repo, SHA) without expiry
+commit_cache = LRUCache(max_entries=int(os.environ.get("COMMIT_CACHE_SIZE", "4096")))
+# Annotations of a completed check run never change, so they are memoized by (repo, run id)
+annotation_cache = LRUCache(max_entries=int(os.environ.get("ANNOTATION_CACHE_SIZE", "4096")))
+
+COMMIT_FETCH_CONCURRENCY = int(os.environ.get("COMMIT_FETCH_CONCURRENCY", "8"))
+ANNOTATION_FETCH_CONCURRENCY = int(os.environ.get("ANNOTATION_FETCH_CONCURRENCY", "8"))
+RATE_LIMIT_RETRIES = int(os.environ.get("GITHUB_RATE_LIMIT_RETRIES", "3"))
+
+
+class GitHubError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(f"GitHub API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+def rate_limit_delay(resp, attempt):
+    """
+    Seconds to wait before retrying a rate-limited response, or None if `resp`
+    is not a rate-limit rejection. Honours Retry-After (secondary limits) and
+    X-RateLimit-Reset (primary limit), falling back to exponential backoff.
+    """
+    if resp.status_code not in (403, 429):
+        return None
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after:
+        return float(retry_after)
+    if resp.headers.get("X-RateLimit-Remaining") == "0":
+        reset = float(resp.headers.get("X-RateLimit-Reset", "0"))
+        return max(reset - time.time(), 1)
+    if resp.status_code == 429:
+        return 2 ** attempt
+    return None
+
+
+def repo_path(repo_url):
+    return repo_url.rstrip("/").replace("https://github.com/", "")
+
+
+# Output field -> (GraphQL selection, extractor) for the open PR listing
+PR_FIELDS = {
+    "number": ("number", lambda n: n["number"]),
+    "title": ("title", lambda n: n["title"]),
+    "author": ("author { login }", lambda n: n["author"]["login"] if n.get("author") else ""),
+    "body": ("body", lambda n: n["body"]),
+    "url": ("url", lambda n: n["url"]),
+    "commit_count": ("commits { totalCount }", lambda n: n["commits"]["totalCount"]),
+    "head_sha": ("headRefOid", lambda n: n["headRefOid"]),
+    "head_ref": ("headRefName", lambda n: n["headRefName"]),
+    "labels": ("labels(first: 20) { nodes { name } }", lambda n: [label["name"] for label in n["labels"]["nodes"]]),
+    "updated_at": ("updatedAt", lambda n: n["updatedAt"]),
+}
+
+PR_LIST_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(states: OPEN, first: $first, after: $after, orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { %s }
+    }
+  }
+}
+"""
+
+
+class GitHubClient:
+    """
+    Thin async wrapper over the GitHub REST API for a single user token.
+    Cheap to construct per request: all instances share the "github" pool.
+    Every call goes through the rate-limit scheduler at the client's priority.
+    """
+
+    def __init__(self, token, priority=INTERACTIVE):
+        self.token = token
+        self.priority = priority
+        self.accessible = set()
+        self.headers = {
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json",
+        }
+
+    async def request(self, method, url, headers=None, **kwargs):
+        headers = {**self.headers, **(headers or {})}
+        resource = "graphql" if url == "/graphql" else "core"
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            # A rejected attempt blocks the budget, so the next acquire waits out the back-off
+            async with scheduler.slot(self.token, self.priority, resource) as budget:
+                resp = await get_pool("github").request(method, url, headers=headers, **kwargs)
+            delay = rate_limit_delay(resp, attempt)
+            budget.update(resp.headers, delay)
+            if delay is None or attempt == RATE_LIMIT_RETRIES:
+                break
+        if resp.status_code >= 400:
+            try:
+                message = resp.json().get("message", resp.text)
+            except ValueError:
+                message = resp.text
+            raise GitHubError(resp.status_code, message)
+        return resp
+
+    async def cached_get(self, url, params=None):
+        """
+        GETs `url` through the shared response cache and returns (data, links).
+        Stale entries are revalidated with If-None-Match/If-Modified-Since.
+        """
+        full_url = str(httpx.URL(url, params=params)) if params else url
+        key = response_cache.key(self.token, full_url)
+        entry = response_cache.get(key)
+        if entry is not None and response_cache.is_fresh(entry):
+            response_cache.hits += 1
+            return entry.data, entry.links
+        resp = await self.request("GET", full_url, headers=entry.validators() if entry else None)
+        if resp.status_code == 304 and entry is not None:
+            response_cache.revalidated += 1
+            response_cache.touch(key, entry)
+            return entry.data, entry.links
+        response_cache.misses += 1
+        data = resp.json()
+        links = {rel: {"url": link["url"]} for rel, link in resp.links.items()}
+        response_cache.put(key, CacheEntry(data, links, resp.headers.get("ETag"), resp.headers.get("Last-Modified")))
+        return data, links
+
+    async def get(self, url, params=None):
+        data, _ = await self.cached_get(url, params)
+        return data
+
+    async def post(self, url, json=None):
+        resp = await self.request("POST", url, json=json)
+        return resp.json()
+
+    async def graphql(self, query, variables=None):
+        # GraphQL has no conditional requests, so results are only reused within the TTL
+        body = {"query": query, "variables": variables or {}}
+        key = response_cache.key(self.token, "/graphql#" + json.dumps(body, sort_keys=True))
+        entry = response_cache.get(key)
+        if entry is not None and response_cache.is_fresh(entry):
+            response_cache.hits += 1
+            return entry.data
+        response_cache.misses += 1
+        data = await self.post("/graphql", json=body)
+        if data.get("errors"):
+            raise GitHubError(200, data["errors"][0].get("message", "GraphQL error"))
+        response_cache.put(key, CacheEntry(data["data"]))
+        return data["data"]
+
+    async def list_open_prs(self, owner_repo, fields=None, first=100, after=None):
+        """
+        Fetches one page of open PRs, including commit counts, in a single GraphQL call.
+        Returns (prs, next_cursor); next_cursor is None on the last page.
+        """
+        fields = fields or list(PR_FIELDS)
+        selection = " ".join(PR_FIELDS[f][0] for f in fields)
+        owner, name = owner_repo.split("/", 1)
+        data = await self.graphql(
+            PR_LIST_QUERY % selection,
+            {"owner": owner, "name": name, "first": first, "after": after},
+        )
+        if data.get("repository") is None:
+            raise GitHubError(404, f"Repository {owner_repo} not found")
+        page = data["repository"]["pullRequests"]
+        prs = [{f: PR_FIELDS[f][1](node) for f in fields} for node in page["nodes"]]
+        info = page["pageInfo"]
+        return prs, info["endCursor"] if info["hasNextPage"] else None
+
+    async def get_commit_files(self, owner_repo, sha):
+        key = (owner_repo, sha)
+        files = commit_cache.get(key)
+        if files is None:
+            # Bypasses the response cache: the trimmed file list is all we keep
+            resp = await self.request("GET", f"/repos/{owner_repo}/commits/{sha}")
+            commit_obj = resp.json()
+            files = [
+                {"filename": f["filename"], "patch": f.get("patch", "(No patch available)")}
+                for f in commit_obj.get("files", [])
+            ]
+            commit_cache.put(key, files)
+        return files
+
+    async def get_many_commit_files(self, owner_repo, shas, concurrency=None):
+        """Fetches the file lists of several commits in parallel, at most `concurrency` at a time."""
+        semaphore = asyncio.Semaphore(concurrency or COMMIT_FETCH_CONCURRENCY)
+
+        async def fetch(sha):
+            async with semaphore:
+                return await self.get_commit_files(owner_repo, sha)
+
+        return await asyncio.gather(*[fetch(sha) for sha in shas])
+
+    async def iter_commit_files(self, owner_repo, commits, concurrency=None):
+        """
+        Consumes an async iterable of commits and yields (commit, files) in order.
+        At most `concurrency` file lists are in flight or buffered at once, so
+        memory stays bounded no matter how many commits the PR has.
+        """
+        window = concurrency or COMMIT_FETCH_CONCURRENCY
+        pending = deque()
+        try:
+            async for c in commits:
+                pending.append((c, asyncio.ensure_future(self.get_commit_files(owner_repo, c["sha"]))))
+                if len(pending) >= window:
+                    c, task = pending.popleft()
+                    yield c, await task
+            while pending:
+                c, task = pending.popleft()
+                yield c, await task
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def get_check_runs(self, owner_repo, sha):
+        """Every check run of `sha`, across all pages."""
+        return [run async for run in self.paginate(f"/repos/{owner_repo}/commits/{sha}/check-runs", key="check_runs")]
+
+    async def get_annotations(self, owner_repo, run):
+        """
+        All annotations of a check run, trimmed to the fields we show. Runs that
+        report no annotations cost no request; completed runs are cached.
+        """
+        if not (run.get("output") or {}).get("annotations_count"):
+            return []
+        key = (owner_repo, run["id"])
+        annotations = annotation_cache.get(key)
+        if annotations is None:
+            annotations = [
+                {
+                    "path": a.get("path"),
+                    "start_line": a.get("start_line"),
+                    "end_line": a.get("end_line"),
+                    "annotation_level": a.get("annotation_level"),
+                    "title": a.get("title"),
+                    "message": a.get("message"),
+                }
+                async for a in self.paginate(f"/repos/{owner_repo}/check-runs/{run['id']}/annotations")
+            ]
+            if run.get("status") == "completed":
+                annotation_cache.put(key, annotations)
+        return annotations
+
+    async def get_many_annotations(self, owner_repo, runs, concurrency=None):
+        """Fetches the annotations of several check runs in parallel."""
+        semaphore = asyncio.Semaphore(concurrency or ANNOTATION_FETCH_CONCURRENCY)
+
+        async def fetch(run):
+            async with semaphore:
+                return await self.get_annotations(owner_repo, run)
+
+        return await asyncio.gather(*[fetch(run) for run in runs])
+
+    async def check_access(self, owner_repo):
+        """
+        Raises GitHubError unless this token can read the repository. Answers
+        come from the response cache and are revalidated by ETag, so repeated
+        checks are cheap. Each client checks a repository once.
+        """
+        if owner_repo not in self.accessible:
+            await self.get(f"/repos/{owner_repo}")
+            self.accessible.add(owner_repo)
+
+    async def paginate(self, url, params=None, key=None):
+        """
+        Yields every item of a paginated list endpoint, following the Link header.
+        `key` selects the list inside wrapped responses (e.g. "check_runs").
+        """
+        params = {"per_page": 100, **(params or {})}
+        while url:
+            data, links = await self.cached_get(url, params)
+            for item in (data.get(key, []) if key else data):
+                yield item
+            url = links.get("next", {}).get("url")
+            # The next link already carries the query string
+            params = None
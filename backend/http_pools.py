@@ -0,0 +1,136 @@
+import importlib.util
+import os
+import time
+from contextlib import asynccontextmanager
+import httpx
+import metrics
+
+HTTP2 = os.environ.get("HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# name -> (base URL, request timeout in seconds)
+POOL_SETTINGS = {
+    "github": (os.environ.get("GITHUB_API_URL", "https://api.github.com"), float(os.environ.get("GITHUB_TIMEOUT", "30"))),
+    "github_web": (os.environ.get("GITHUB_WEB_URL", "https://github.com"), float(os.environ.get("GITHUB_TIMEOUT", "30"))),
+    "groq": (os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1"), float(os.environ.get("GROQ_TIMEOUT", "120"))),
+}
+
+_pools = {}
+
+
+class HTTPPool:
+    """
+    A long-lived AsyncClient for one upstream host, with keep-alive, optional
+    HTTP/2 and counters for requests, errors, time spent and new connections.
+    """
+
+    def __init__(self, name, base_url, timeout):
+        self.name = name
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            http2=HTTP2,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10)),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    async def trace(self, event, info):
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    def _extensions(self, kwargs):
+        return {**kwargs.pop("extensions", {}), "trace": self.trace}
+
+    async def request(self, method, url, **kwargs):
+        extensions = self._extensions(kwargs)
+        self.requests += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        status = "error"
+        try:
+            with metrics.span(f"{self.name} {method} {metrics.route_template(str(url))}"):
+                resp = await self.client.request(method, url, extensions=extensions, **kwargs)
+            status = resp.status_code
+            return resp
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.in_flight -= 1
+            self.total_seconds += elapsed
+            metrics.observe_upstream(self.name, method, url, status, elapsed)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """Streams a response; metrics cover the whole body, not just the headers."""
+        extensions = self._extensions(kwargs)
+        self.requests += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        status = "error"
+        try:
+            with metrics.span(f"{self.name} {method} {metrics.route_template(str(url))} (stream)"):
+                async with self.client.stream(method, url, extensions=extensions, **kwargs) as resp:
+                    status = resp.status_code
+                    yield resp
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.in_flight -= 1
+            self.total_seconds += elapsed
+            metrics.observe_upstream(self.name, method, url, status, elapsed)
+
+    def stats(self):
+        return {
+            "base_url": str(self.client.base_url),
+            "http2": HTTP2,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_ms": round(self.total_seconds / self.requests * 1000, 1) if self.requests else 0.0,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+        }
+
+
+def get_pool(name):
+    """Returns the shared pool for `name`, creating it on first use."""
+    pool = _pools.get(name)
+    if pool is None:
+        base_url, timeout = POOL_SETTINGS[name]
+        pool = _pools[name] = HTTPPool(name, base_url, timeout)
+    return pool
+
+
+def open_pools():
+    for name in POOL_SETTINGS:
+        get_pool(name)
+
+
+async def close_pools():
+    for pool in list(_pools.values()):
+        await pool.client.aclose()
+    _pools.clear()
+
+
+def pool_stats():
+    return {name: pool.stats() for name, pool in _pools.items()}
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+import uuid
+
+REVIEW_WORKERS = int(os.environ.get("REVIEW_WORKERS", "2"))
+REVIEW_QUEUE_SIZE = int(os.environ.get("REVIEW_QUEUE_SIZE", "32"))
+# How long finished jobs stay queryable
+JOB_RETENTION = float(os.environ.get("REVIEW_JOB_RETENTION", "3600"))
+# Longest quiet spell in an event stream before a keepalive is sent
+JOB_KEEPALIVE = float(os.environ.get("REVIEW_JOB_KEEPALIVE", "15"))
+
+QUEUED, RUNNING, DONE, ERROR, CANCELLED = "queued", "running", "done", "error", "cancelled"
+FINISHED = (DONE, ERROR, CANCELLED)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key, run, subscriber):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.run = run
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Sessions waiting on the job; only they can cancel their interest in it
+        self.subscribers = {subscriber}
+        self.task = None
+        # Everything streamed so far, replayed to late event subscribers
+        self.tokens = []
+        # Latest progress report, e.g. {"chunks_done": 3, "chunks_total": 8}
+        self.progress = None
+        self.changed = asyncio.Condition()
+        # Extra details set by the job's run function, returned with the job
+        self.meta = {}
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def emit_token(self, text):
+        self.tokens.append(text)
+        await self.notify()
+
+    async def emit_progress(self, **progress):
+        self.progress = progress
+        await self.notify()
+
+    async def finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        await self.notify()
+
+    async def events(self, keepalive=None):
+        """
+        Yields ("token", text) for every streamed token and ("progress", dict)
+        when progress is reported, then (status, result or error). With
+        `keepalive`, ("keepalive", None) is yielded after that many quiet seconds.
+        """
+        sent = 0
+        progress = None
+        while True:
+            try:
+                async with self.changed:
+                    await asyncio.wait_for(self.changed.wait_for(
+                        lambda: len(self.tokens) > sent or self.progress is not progress or self.status in FINISHED
+                    ), keepalive)
+            except asyncio.TimeoutError:
+                yield "keepalive", None
+                continue
+            if self.progress is not progress:
+                progress = self.progress
+                yield "progress", progress
+            while sent < len(self.tokens):
+                yield "token", self.tokens[sent]
+                sent += 1
+            if self.status in FINISHED:
+                yield self.status, self.result if self.status == DONE else self.error
+                return
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress,
+            **self.meta,
+        }
+
+
+class JobQueue:
+    """
+    In-process worker pool over a bounded queue. Submitting a job whose key
+    matches a queued or running job returns the existing job instead of
+    starting a duplicate.
+    """
+
+    def __init__(self, workers=None, max_queued=None):
+        self.worker_count = workers or REVIEW_WORKERS
+        self.queue = asyncio.Queue(max_queued or REVIEW_QUEUE_SIZE)
+        self.jobs = {}
+        self.active = {}
+        self.workers = []
+
+    def start(self):
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def submit(self, key, run, subscriber):
+        """
+        Queues `run(job)` under `key` for `subscriber` (e.g. the caller's session)
+        and returns its Job. Raises QueueFull when the queue is at capacity.
+        """
+        self.prune()
+        existing = self.active.get(key)
+        if existing is not None:
+            existing.subscribers.add(subscriber)
+            return existing
+        job = Job(key, run, subscriber)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull("Too many reviews in progress, try again shortly")
+        self.jobs[job.id] = job
+        self.active[key] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def cancel(self, job, subscriber):
+        """
+        Drops `subscriber` from the job; the job itself is cancelled once nobody
+        is waiting on it. Returns False if `subscriber` wasn't waiting on it.
+        """
+        if job.status in FINISHED:
+            return True
+        if subscriber not in job.subscribers:
+            return False
+        job.subscribers.discard(subscriber)
+        if job.subscribers:
+            return True
+        if self.active.get(job.key) is job:
+            del self.active[job.key]
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            await job.finish(CANCELLED)
+        return True
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                await job.notify()
+                job.task = asyncio.create_task(job.run(job))
+                try:
+                    await job.finish(DONE, result=await job.task)
+                except asyncio.CancelledError:
+                    if not job.task.cancelled():
+                        raise
+                    await job.finish(CANCELLED)
+                except Exception as e:
+                    import traceback
+                    traceback.print_exc()
+                    await job.finish(ERROR, error=str(e))
+            finally:
+                if self.active.get(job.key) is job:
+                    del self.active[job.key]
+                self.queue.task_done()
@@ -1,23 +1,73 @@
 import os
-import httpx
+import json
+import hmac
+import asyncio
+import hashlib
+import time
 import uuid
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import RedirectResponse, JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from urllib.parse import urlencode
 from dotenv import load_dotenv
-from github import Github
 
+# Local modules read their settings from the environment at import time
 load_dotenv()
 
+from github_client import PR_FIELDS, GitHubClient, GitHubError, annotation_cache, commit_cache, repo_path, response_cache
+from http_pools import close_pools, get_pool, open_pools, pool_stats
+from rate_limit import BULK, NORMAL, scheduler
+from bulk_reviews import BulkReviewStore, filter_prs
+from diff_filter import DiffStats, prefilter
+from git_mirror import GitError, create_git_mirror
+from jobs import JOB_KEEPALIVE, JobQueue, QueueFull
+import metrics
+from pr_index import PRIndex
+from review import GroqReviewer
+from review_cache import ReviewCache
+from session_store import create_session_store
+
 GITHUB_CLIENT_ID = os.environ["GITHUB_CLIENT_ID"]
 GITHUB_CLIENT_SECRET = os.environ["GITHUB_CLIENT_SECRET"]
 OAUTH_CALLBACK_URL = os.environ["OAUTH_CALLBACK_URL"]
 GROQ_API_KEY = os.environ["GROQ_API_KEY"]
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama3-70b-8192")
+GITHUB_WEBHOOK_SECRET = os.environ.get("GITHUB_WEBHOOK_SECRET", "")
+DASHBOARD_CONCURRENCY = int(os.environ.get("DASHBOARD_CONCURRENCY", "10"))
+# Check runs with more annotations than this return them grouped by file
+ANNOTATION_COMPACT_THRESHOLD = int(os.environ.get("ANNOTATION_COMPACT_THRESHOLD", "50"))
+# PRs reviewed at once within a bulk batch, and batches run at once
+BULK_REVIEW_CONCURRENCY = int(os.environ.get("BULK_REVIEW_CONCURRENCY", "8"))
+BULK_REVIEW_BATCHES = int(os.environ.get("BULK_REVIEW_BATCHES", "1"))
+
+review_cache = ReviewCache(
+    os.environ.get("REVIEW_CACHE_PATH", "review_cache.sqlite3"),
+    max_bytes=int(os.environ.get("REVIEW_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+)
+reviewer = GroqReviewer(GROQ_API_KEY, GROQ_MODEL, cache=review_cache)
+review_jobs = JobQueue()
+# Batches get their own workers so they never hold up interactive reviews
+bulk_jobs = JobQueue(workers=BULK_REVIEW_BATCHES, max_queued=10)
+bulk_store = BulkReviewStore(os.environ.get("BULK_REVIEW_PATH", "bulk_reviews.sqlite3"))
+session_store = create_session_store()
+pr_index = PRIndex(os.environ.get("PR_INDEX_PATH", "pr_index.sqlite3"))
+# Local git mirrors for commits and diffs when GIT_MIRROR_DIR is set
+git_mirror = create_git_mirror()
+
+@asynccontextmanager
+async def lifespan(app):
+    open_pools()
+    review_jobs.start()
+    bulk_jobs.start()
+    yield
+    await bulk_jobs.stop()
+    await review_jobs.stop()
+    await session_store.close()
+    await close_pools()
 
-app = FastAPI()
-user_tokens = {}
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,8 +77,105 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def require_user_token(state: str):
-    token = user_tokens.get(state)
+def route_of(request):
+    """The matched route template (e.g. /api/reviews/{job_id}), so metrics labels stay bounded."""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    route = route_of(request)
+    method = request.method
+    metrics.http_in_flight.inc(method, route)
+    start = time.perf_counter()
+    status = 500
+    # With PROFILE_ALLOW_HEADER=1, X-Profile: 1 dumps this request's span tree whatever its duration
+    force = metrics.PROFILE_ALLOW_HEADER and request.headers.get("X-Profile") == "1"
+    with metrics.profile(f"{method} {route}", force=force):
+        try:
+            # Streaming responses are timed up to their first byte
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.http_in_flight.dec(method, route)
+            metrics.http_requests.inc(method, route, status)
+            metrics.http_duration.observe(method, route, value=time.perf_counter() - start)
+
+@metrics.registry.collector
+def collect_stats():
+    for name, pool in pool_stats().items():
+        metrics.upstream_in_flight.set(name, value=pool["in_flight"])
+    caches = {"github": response_cache.stats(), "commits": commit_cache.stats(),
+              "annotations": annotation_cache.stats(), "reviews": review_cache.stats()}
+    for name, stats in caches.items():
+        hits = stats["hits"] + stats.get("revalidated", 0)
+        lookups = hits + stats["misses"]
+        metrics.cache_hits.set(name, value=hits)
+        metrics.cache_misses.set(name, value=stats["misses"])
+        metrics.cache_hit_ratio.set(name, value=round(hits / lookups, 3) if lookups else 0.0)
+        metrics.cache_entries.set(name, value=stats["entries"])
+    for (token, resource), budget in scheduler.budgets.items():
+        stats = budget.stats()
+        if stats["limit"] is not None:
+            metrics.rate_limit_remaining.set(token, resource, value=stats["remaining"])
+            metrics.rate_limit_limit.set(token, resource, value=stats["limit"])
+            metrics.rate_limit_reset.set(token, resource, value=stats["reset_in"] or 0)
+        for priority, queued in stats["queued"].items():
+            metrics.scheduler_queued.set(token, resource, priority, value=queued)
+    metrics.review_jobs_queued.set(value=review_jobs.queue.qsize())
+    if git_mirror:
+        stats = git_mirror.stats()
+        metrics.git_mirror_bytes.set(value=stats["bytes"])
+        for result, key in (("fetched", "fetches"), ("up_to_date", "up_to_date"), ("evicted", "evictions")):
+            metrics.git_mirror_fetches.set(result, value=stats[key])
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of request, upstream, cache, rate-limit and LLM token metrics."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/webhooks/github")
+async def github_webhook(request: Request):
+    """
+    Receives pull_request, push, status and check_run deliveries and applies
+    them to the local PR index. Deliveries must be signed with GITHUB_WEBHOOK_SECRET.
+    """
+    if not GITHUB_WEBHOOK_SECRET:
+        raise HTTPException(503, detail="Webhook secret not configured")
+    body = await request.body()
+    expected = "sha256=" + hmac.new(GITHUB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, request.headers.get("X-Hub-Signature-256", "")):
+        raise HTTPException(401, detail="Invalid webhook signature")
+    event = request.headers.get("X-GitHub-Event", "")
+    processed = await pr_index.apply_event(event, json.loads(body))
+    return {"event": event, "processed": processed}
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    return {
+        "github": response_cache.stats(),
+        "commits": commit_cache.stats(),
+        "annotations": annotation_cache.stats(),
+        "reviews": review_cache.stats(),
+        "git_mirror": git_mirror.stats() if git_mirror else None,
+    }
+
+@app.get("/api/rate-limit")
+async def rate_limit(state: str):
+    """The caller's GitHub budget as seen by the scheduler, per API resource."""
+    token = await require_user_token(state)
+    return scheduler.stats(token)
+
+@app.get("/api/http-pools")
+async def http_pools():
+    return pool_stats()
+
+async def require_user_token(state: str):
+    token = await session_store.get(state)
     if not token:
         raise HTTPException(401, detail="User not logged in or token expired")
     return token
@@ -47,98 +194,212 @@ async def login_github():
 
 @app.get("/auth/github/callback")
 async def github_callback(code: str, state: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://github.com/login/oauth/access_token",
-            data={
-                "client_id": GITHUB_CLIENT_ID,
-                "client_secret": GITHUB_CLIENT_SECRET,
-                "code": code,
-                "redirect_uri": OAUTH_CALLBACK_URL,
-                "state": state
-            },
-            headers={"Accept": "application/json"}
-        )
-        token_json = response.json()
-        access_token = token_json.get("access_token")
-        if not access_token:
-            raise HTTPException(401, detail="GitHub OAuth failed")
-        user_tokens[state] = access_token
+    response = await get_pool("github_web").post(
+        "/login/oauth/access_token",
+        data={
+            "client_id": GITHUB_CLIENT_ID,
+            "client_secret": GITHUB_CLIENT_SECRET,
+            "code": code,
+            "redirect_uri": OAUTH_CALLBACK_URL,
+            "state": state
+        },
+        headers={"Accept": "application/json"}
+    )
+    token_json = response.json()
+    access_token = token_json.get("access_token")
+    if not access_token:
+        raise HTTPException(401, detail="GitHub OAuth failed")
+    await session_store.set(state, access_token)
     return RedirectResponse(f"http://localhost:8501/?state={state}")
 
 @app.get("/api/list-prs")
-async def list_prs(repo_url: str, state: str):
-    token = require_user_token(state)
-    owner_repo = repo_url.rstrip("/").replace("https://github.com/", "")
-    gh = Github(token)
-    repo = gh.get_repo(owner_repo)
-    prs = repo.get_pulls(state="open")
+async def list_prs(repo_url: str, state: str, per_page: int = None, cursor: str = None, fields: str = None):
+    """
+    Lists open PRs via batched GraphQL pages of up to 100 PRs each.
+    Without `per_page` every page is fetched; with it a single page is returned
+    along with `next_cursor`. `fields` is an optional comma-separated projection.
+    """
+    token = await require_user_token(state)
+    owner_repo = repo_path(repo_url)
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    unknown = [f for f in selected or [] if f not in PR_FIELDS]
+    if unknown:
+        raise HTTPException(400, detail=f"Unknown fields: {', '.join(unknown)}")
+    gh = GitHubClient(token)
+    if await pr_index.is_tracked(owner_repo):
+        return await list_indexed_prs(gh, owner_repo, selected, per_page, cursor)
+    if per_page:
+        prs, next_cursor = await gh.list_open_prs(owner_repo, selected, min(max(per_page, 1), 100), cursor)
+        return {"prs": prs, "next_cursor": next_cursor}
+    return {"prs": await list_all_open_prs(gh, owner_repo, selected)}
+
+async def list_all_open_prs(gh, owner_repo, fields=None):
     result = []
-    for pr in prs:
-        result.append({
-            "number": pr.number,
-            "title": pr.title,
-            "author": pr.user.login,
-            "body": pr.body,
-            "url": pr.html_url,
-            "commit_count": pr.commits
-        })
-    return {"prs": result}
+    cursor = None
+    while True:
+        prs, cursor = await gh.list_open_prs(owner_repo, fields, 100, cursor)
+        result.extend(prs)
+        if not cursor:
+            break
+    return result
+
+async def list_indexed_prs(gh, owner_repo, fields, per_page, cursor):
+    """Serves list-prs from the webhook-maintained index, seeding it from GitHub the first time."""
+    # The index is shared by every user, so each token must be able to read the repo itself
+    await gh.check_access(owner_repo)
+    if not await pr_index.is_ready(owner_repo):
+        await pr_index.seed_pulls(owner_repo, await list_all_open_prs(gh, owner_repo))
+    fields = fields or list(PR_FIELDS)
+    if per_page:
+        offset = int(cursor[len("idx:"):]) if cursor and cursor.startswith("idx:") else 0
+        limit = min(max(per_page, 1), 100)
+        prs = await pr_index.open_pulls(owner_repo, limit + 1, offset)
+        next_cursor = f"idx:{offset + limit}" if len(prs) > limit else None
+        return {"prs": [{f: pr[f] for f in fields} for pr in prs[:limit]], "next_cursor": next_cursor}
+    prs = await pr_index.open_pulls(owner_repo)
+    return {"prs": [{f: pr[f] for f in fields} for pr in prs]}
+
+async def resolve_head_sha(gh, owner_repo, pr_number):
+    head_sha = await pr_index.head_sha(owner_repo, pr_number)
+    if head_sha is None:
+        pr = await gh.get(f"/repos/{owner_repo}/pulls/{pr_number}")
+        head_sha = pr["head"]["sha"]
+    else:
+        await gh.check_access(owner_repo)
+    return head_sha
+
+def commit_summary(c, files):
+    return {
+        "sha": c["sha"],
+        "message": c["commit"]["message"],
+        # Mirrored commits have no GitHub user, only the git author name
+        "author": c["author"]["login"] if c.get("author") else c["commit"]["author"].get("name", ""),
+        "date": c["commit"]["author"]["date"],
+        "files": files
+    }
+
+async def sync_mirror(gh, owner_repo, pr_number):
+    """
+    Brings the local mirror up to date for the PR and returns (base, head_sha),
+    or None when the mirror is off or failed and the REST API should be used.
+    """
+    if git_mirror is None:
+        return None
+    pr = await gh.get(f"/repos/{owner_repo}/pulls/{pr_number}")
+    try:
+        base = await git_mirror.sync(owner_repo, gh.token, pr)
+    except (GitError, OSError, ValueError):
+        import traceback
+        traceback.print_exc()
+        return None
+    return base, pr["head"]["sha"]
+
+def iter_commit_diffs(gh, owner_repo, pr_number, mirrored):
+    """(commit, files) pairs from the mirror when `mirrored` is (base, head), else from the REST API."""
+    if mirrored:
+        return git_mirror.iter_commits(owner_repo, *mirrored)
+    commits = gh.paginate(f"/repos/{owner_repo}/pulls/{pr_number}/commits")
+    return gh.iter_commit_files(owner_repo, commits)
+
+async def stream_commits_with_diffs(gh, owner_repo, pr_number):
+    """Yields one NDJSON line per commit as soon as its diff is available."""
+    try:
+        mirrored = await sync_mirror(gh, owner_repo, pr_number)
+        async for c, files in iter_commit_diffs(gh, owner_repo, pr_number, mirrored):
+            yield json.dumps(commit_summary(c, files)) + "\n"
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        yield json.dumps({"error": str(e)}) + "\n"
 
 @app.get("/api/pr-commits-with-diffs")
-async def pr_commits_with_diffs(repo_url: str, pr_number: int, state: str):
+async def pr_commits_with_diffs(repo_url: str, pr_number: int, state: str, stream: bool = False):
     try:
-        token = require_user_token(state)
-        owner_repo = repo_url.rstrip("/").replace("https://github.com/", "")
-        gh = Github(token)
-        repo = gh.get_repo(owner_repo)
-        pr = repo.get_pull(pr_number)
-        commits = pr.get_commits()
-        out = []
-        for c in commits:
-            commit_obj = repo.get_commit(c.sha)
-            files = []
-            for f in commit_obj.files:
-                files.append({
-                    "filename": f.filename,
-                    "patch": getattr(f, "patch", "(No patch available)")
-                })
-            out.append({
-                "sha": c.sha,
-                "message": c.commit.message,
-                "author": c.author.login if c.author else "",
-                "date": c.commit.author.date.isoformat(),
-                "files": files
-            })
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token, BULK)
+        if stream:
+            return StreamingResponse(
+                stream_commits_with_diffs(gh, owner_repo, pr_number),
+                media_type="application/x-ndjson"
+            )
+        mirrored = await sync_mirror(gh, owner_repo, pr_number)
+        if mirrored:
+            out = [commit_summary(c, files) async for c, files in iter_commit_diffs(gh, owner_repo, pr_number, mirrored)]
+            return {"commits": out}
+        commits = [c async for c in gh.paginate(f"/repos/{owner_repo}/pulls/{pr_number}/commits")]
+        commit_files = await gh.get_many_commit_files(owner_repo, [c["sha"] for c in commits])
+        out = [commit_summary(c, files) for c, files in zip(commits, commit_files)]
         return {"commits": out}
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse({"error": str(e)}, status_code=500)
 
+async def get_pr_status(gh, owner_repo, head_sha):
+    indexed = await pr_index.statuses(owner_repo, head_sha)
+    if indexed is not None:
+        await gh.check_access(owner_repo)
+        return indexed
+    combined_status = await gh.get(f"/repos/{owner_repo}/commits/{head_sha}/status")
+    if await pr_index.is_tracked(owner_repo):
+        await pr_index.seed_statuses(owner_repo, head_sha, combined_status["statuses"])
+    checks = []
+    for status in combined_status["statuses"]:
+        checks.append({
+            "context": status["context"],
+            "state": status["state"],
+            "description": status["description"],
+            "target_url": status["target_url"],
+            "created_at": status["created_at"],
+        })
+    return {
+        "state": combined_status["state"],
+        "checks": checks,
+    }
+
+def group_annotations(annotations):
+    """Compact form of a large annotation set: {path: [[start, end, level, title, message], ...]}."""
+    by_file = {}
+    for a in annotations:
+        by_file.setdefault(a["path"] or "", []).append(
+            [a["start_line"], a["end_line"], a["annotation_level"], a["title"], a["message"]]
+        )
+    return by_file
+
+async def get_check_summaries(gh, owner_repo, head_sha, annotations=True):
+    runs = await pr_index.check_runs(owner_repo, head_sha)
+    if runs is not None:
+        await gh.check_access(owner_repo)
+    else:
+        runs = await gh.get_check_runs(owner_repo, head_sha)
+        if await pr_index.is_tracked(owner_repo):
+            await pr_index.seed_check_runs(owner_repo, head_sha, runs)
+    # The listing only carries annotation counts; each run's annotations are a separate paginated call
+    run_annotations = await gh.get_many_annotations(owner_repo, runs) if annotations else [[] for _ in runs]
+    result = []
+    for run, anns in zip(runs, run_annotations):
+        summary = {
+            "title": run.get("name"),
+            "status": run.get("conclusion") or run.get("status"),
+            "summary": (run.get("output") or {}).get("summary") or "",
+            "annotation_count": len(anns),
+            "annotations": anns,
+            "details_url": run.get("details_url"),
+        }
+        if len(anns) > ANNOTATION_COMPACT_THRESHOLD:
+            summary["annotations"] = []
+            summary["annotations_by_file"] = group_annotations(anns)
+        result.append(summary)
+    return result
+
 @app.get("/api/pr-status")
 async def pr_status(repo_url: str, pr_number: int, state: str):
     try:
-        token = require_user_token(state)
-        owner_repo = repo_url.rstrip("/").replace("https://github.com/", "")
-        gh = Github(token)
-        repo = gh.get_repo(owner_repo)
-        pr = repo.get_pull(pr_number)
-        commit = repo.get_commit(pr.head.sha)
-        combined_status = commit.get_combined_status()
-        checks = []
-        for status in combined_status.statuses:
-            checks.append({
-                "context": status.context,
-                "state": status.state,
-                "description": status.description,
-                "target_url": status.target_url,
-                "created_at": status.created_at.isoformat(),
-            })
-        return {
-            "state": combined_status.state,
-            "checks": checks,
-        }
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token)
+        return await get_pr_status(gh, owner_repo, await resolve_head_sha(gh, owner_repo, pr_number))
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -148,96 +409,280 @@ async def pr_status(repo_url: str, pr_number: int, state: str):
 async def pr_check_summaries(repo_url: str, pr_number: int, state: str):
     """
     Returns all GitHub Action check runs summaries (e.g. linter/test output) for the PR's latest commit,
-    including inline annotations for each run (if present).
+    including inline annotations for each run (if present). Runs with more than
+    ANNOTATION_COMPACT_THRESHOLD annotations return them as `annotations_by_file`.
     """
     try:
-        token = require_user_token(state)
-        owner_repo = repo_url.rstrip("/").replace("https://github.com/", "")
-        gh = Github(token)
-        repo = gh.get_repo(owner_repo)
-        pr = repo.get_pull(pr_number)
-        head_sha = pr.head.sha
-
-        # Fetch check runs from GitHub v3 API
-        import requests as pyrequests
-        url = f"https://api.github.com/repos/{owner_repo}/commits/{head_sha}/check-runs"
-        headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github+json"}
-        resp = pyrequests.get(url, headers=headers)
-        result = []
-        if resp.ok:
-            data = resp.json()
-            for run in data.get("check_runs", []):
-                summary = run.get("output", {}).get("summary") or ""
-                title = run.get("name")
-                status = run.get("conclusion") or run.get("status")
-                details_url = run.get("details_url")
-                # Inline annotations:
-                annotations = []
-                output = run.get("output", {})
-                # Sometimes, the output can have up to 50 annotations. If there are more, use pagination.
-                anns = output.get("annotations", [])
-                if anns:
-                    annotations = anns
-                result.append({
-                    "title": title,
-                    "status": status,
-                    "summary": summary,
-                    "annotations": annotations,
-                    "details_url": details_url,
-                })
-        return {"checks": result}
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token)
+        head_sha = await resolve_head_sha(gh, owner_repo, pr_number)
+        return {"checks": await get_check_summaries(gh, owner_repo, head_sha)}
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.get("/api/pr-dashboard")
+async def pr_dashboard(repo_url: str, state: str):
+    """
+    CI overview of every open PR in one response. Head SHAs come from the PR
+    listing, and each PR's status and check runs are fetched concurrently.
+    Only names and states are returned; use /api/pr-status and
+    /api/pr-check-summaries for descriptions, summaries and annotations.
+    """
+    try:
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token, NORMAL)
+        if await pr_index.is_ready(owner_repo):
+            await gh.check_access(owner_repo)
+            heads = [(pr["number"], pr["head_sha"]) for pr in await pr_index.open_pulls(owner_repo)]
+        else:
+            heads = [
+                (pr["number"], pr["head"]["sha"])
+                async for pr in gh.paginate(f"/repos/{owner_repo}/pulls", {"state": "open"})
+            ]
+        semaphore = asyncio.Semaphore(DASHBOARD_CONCURRENCY)
+
+        async def summarize(number, head_sha):
+            async with semaphore:
+                status, runs = await asyncio.gather(
+                    get_pr_status(gh, owner_repo, head_sha),
+                    get_check_summaries(gh, owner_repo, head_sha, annotations=False),
+                )
+            return {
+                "number": number,
+                "head_sha": head_sha,
+                "state": status["state"],
+                "checks": [{"context": c["context"], "state": c["state"]} for c in status["checks"]],
+                "check_runs": [{"title": r["title"], "status": r["status"]} for r in runs],
+            }
+
+        return {"prs": await asyncio.gather(*[summarize(number, head_sha) for number, head_sha in heads])}
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+async def run_review(gh, owner_repo, pr_number, head_sha, on_token=None, on_progress=None):
+    """
+    Returns (review, cached, diff_stats) for the PR at `head_sha`, reusing a
+    stored review when possible; diff_stats is None for stored reviews.
+    """
+    # Stored reviews are shared across users, like the PR index
+    await gh.check_access(owner_repo)
+    cached = await reviewer.cached_review(owner_repo, head_sha)
+    if cached is not None:
+        return cached, True, None
+    stats = DiffStats()
+    mirrored = await sync_mirror(gh, owner_repo, pr_number)
+    if mirrored:
+        files = git_mirror.iter_pr_files(owner_repo, *mirrored)
+    else:
+        files = gh.paginate(f"/repos/{owner_repo}/pulls/{pr_number}/files")
+    files = prefilter(files, stats)
+    output = await reviewer.review(files, owner_repo, head_sha, on_token, on_progress)
+    metrics.review_diff_tokens.inc("before", amount=stats.tokens_before)
+    metrics.review_diff_tokens.inc("after", amount=stats.tokens_after)
+    return output, False, stats.to_dict()
+
 @app.get("/api/review-pr")
 async def review_pr(repo_url: str, pr_number: int, state: str):
     try:
-        token = require_user_token(state)
-        owner_repo = repo_url.rstrip("/").replace("https://github.com/", "")
-        gh = Github(token)
-        repo = gh.get_repo(owner_repo)
-        pr = repo.get_pull(pr_number)
-        review_text = ""
-        for file in pr.get_files():
-            if not file.patch:
-                continue
-            review_text += f"\n# File: {file.filename}\n{file.patch}\n"
-        prompt = f"""You are a senior software engineer. Review the following GitHub pull request diff for code quality, bugs, and improvement suggestions. Reply in concise bullet points.
-{review_text}
-"""
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": GROQ_MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 512
-                },
-                timeout=120
-            )
-            resp.raise_for_status()
-            output = resp.json()["choices"][0]["message"]["content"]
-        return {"review": output.strip()}
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token, BULK)
+        head_sha = await resolve_head_sha(gh, owner_repo, pr_number)
+        output, cached, diff_stats = await run_review(gh, owner_repo, pr_number, head_sha)
+        return {"review": output, "cached": cached, "diff_stats": diff_stats}
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.post("/api/reviews")
+async def create_review_job(repo_url: str, pr_number: int, state: str):
+    """
+    Queues a PR review and returns its job id right away. Identical reviews
+    already queued or running (same repo, PR and head SHA) share one job.
+    """
+    try:
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token, BULK)
+        head_sha = await resolve_head_sha(gh, owner_repo, pr_number)
+
+        async def run(job):
+            async def on_progress(done, total):
+                await job.emit_progress(chunks_done=done, chunks_total=total)
+
+            output, _, diff_stats = await run_review(gh, owner_repo, pr_number, head_sha, job.emit_token, on_progress)
+            job.meta["diff_stats"] = diff_stats
+            if not job.tokens:
+                await job.emit_token(output)
+            return output
+
+        job = review_jobs.submit(("review", owner_repo, pr_number, head_sha), run, state)
+        return JSONResponse({"job_id": job.id, "status": job.status}, status_code=202)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+def require_job(job_id: str):
+    job = review_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, detail="Review job not found")
+    return job
+
+async def require_job_access(state, job, owner_repo):
+    """
+    Job results can hold review text of private repositories: sessions that
+    subscribed to the job may read them, anyone else only if their token can
+    read the repository.
+    """
+    token = await require_user_token(state)
+    if job is not None and state in job.subscribers:
+        return
+    try:
+        await GitHubClient(token).check_access(owner_repo)
+    except GitHubError:
+        raise HTTPException(403, detail="No access to this repository")
+
+@app.get("/api/reviews/{job_id}")
+async def get_review_job(job_id: str, state: str):
+    job = require_job(job_id)
+    # Review jobs are keyed ("review", owner_repo, pr_number, head_sha)
+    await require_job_access(state, job, job.key[1])
+    return job.to_dict()
+
+@app.get("/api/reviews/{job_id}/events")
+async def review_job_events(job_id: str, state: str):
+    """
+    Server-sent events: `progress` as diff chunks are reviewed, `token` for each
+    generated chunk of text, then `done`, `error` or `cancelled`. Quiet spells
+    get `: keepalive` comments so clients' read timeouts don't fire.
+    """
+    job = require_job(job_id)
+    await require_job_access(state, job, job.key[1])
+
+    async def events():
+        async for name, data in job.events(keepalive=JOB_KEEPALIVE):
+            if name == "keepalive":
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.delete("/api/reviews/{job_id}")
+async def cancel_review_job(job_id: str, state: str):
+    """Withdraws the caller's interest in a review; it is cancelled once no session is waiting on it."""
+    await require_user_token(state)
+    job = require_job(job_id)
+    if not await review_jobs.cancel(job, state):
+        raise HTTPException(403, detail="Not subscribed to this review")
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/api/bulk-reviews")
+async def create_bulk_review(repo_url: str, state: str, label: str = None, author: str = None, updated_since: str = None):
+    """
+    Reviews every open PR matching the filters, BULK_REVIEW_CONCURRENCY at a
+    time, and stores the results. PR heads already reviewed by an earlier batch
+    are skipped. Returns a batch id to poll with GET /api/bulk-reviews/{batch_id}.
+    """
+    try:
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token, BULK)
+        if await pr_index.is_tracked(owner_repo):
+            prs = (await list_indexed_prs(gh, owner_repo, None, None, None))["prs"]
+        else:
+            prs = await list_all_open_prs(gh, owner_repo)
+        prs = filter_prs(prs, label, author, updated_since)
+        filters = {"label": label, "author": author, "updated_since": updated_since}
+
+        async def run(job):
+            try:
+                return await run_batch(job)
+            except asyncio.CancelledError:
+                await bulk_store.set_batch_status(job.id, "cancelled")
+                raise
+            except Exception:
+                # Otherwise the stored batch stays "running" while this process lives, and pollers wait forever
+                await bulk_store.set_batch_status(job.id, "error")
+                raise
+
+        async def run_batch(job):
+            await bulk_store.create_batch(job.id, owner_repo, filters, prs)
+            await bulk_store.set_batch_status(job.id, "running")
+            semaphore = asyncio.Semaphore(BULK_REVIEW_CONCURRENCY)
+
+            async def review_one(pr):
+                async with semaphore:
+                    if await bulk_store.has_review(owner_repo, pr["number"], pr["head_sha"]):
+                        await bulk_store.set_pr_status(job.id, pr["number"], "skipped")
+                        return
+                    await bulk_store.set_pr_status(job.id, pr["number"], "running")
+                    try:
+                        output, _, diff_stats = await run_review(gh, owner_repo, pr["number"], pr["head_sha"])
+                    except Exception as e:
+                        await bulk_store.set_pr_status(job.id, pr["number"], "error", str(e))
+                        return
+                    await bulk_store.save_review(owner_repo, pr["number"], pr["head_sha"], output, diff_stats)
+                    await bulk_store.set_pr_status(job.id, pr["number"], "done")
+
+            await asyncio.gather(*[review_one(pr) for pr in prs])
+            await bulk_store.set_batch_status(job.id, "done")
+            return (await bulk_store.batch(job.id))["progress"]
+
+        job = bulk_jobs.submit(("bulk", owner_repo, label, author, updated_since), run, state)
+        return JSONResponse({"batch_id": job.id, "status": job.status, "total": len(prs)}, status_code=202)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.get("/api/bulk-reviews/{batch_id}")
+async def get_bulk_review(batch_id: str, state: str, include_reviews: bool = False):
+    """Batch status with per-PR progress; `include_reviews` adds the stored review text."""
+    # Stored batches outlive their job, so the repository is checked once the subscribers are gone
+    job = bulk_jobs.get(batch_id)
+    batch = await bulk_store.batch(batch_id, include_reviews)
+    if batch is None and job is None:
+        raise HTTPException(404, detail="Bulk review not found")
+    # Bulk jobs are keyed ("bulk", owner_repo, label, author, updated_since)
+    await require_job_access(state, job, batch["repo"] if batch is not None else job.key[1])
+    if batch is not None:
+        return batch
+    # Still waiting for a worker, so nothing is stored yet
+    return {"batch_id": batch_id, "status": job.status, "progress": None, "prs": []}
+
+@app.delete("/api/bulk-reviews/{batch_id}")
+async def cancel_bulk_review(batch_id: str, state: str):
+    await require_user_token(state)
+    job = bulk_jobs.get(batch_id)
+    if job is None:
+        raise HTTPException(404, detail="Bulk review not running")
+    if not await bulk_jobs.cancel(job, state):
+        raise HTTPException(403, detail="Not subscribed to this bulk review")
+    return {"batch_id": job.id, "status": job.status}
+
 @app.post("/api/approve-pr")
 async def approve_pr(repo_url: str, pr_number: int, state: str):
     try:
-        token = require_user_token(state)
-        owner_repo = repo_url.rstrip("/").replace("https://github.com/", "")
-        gh = Github(token)
-        repo = gh.get_repo(owner_repo)
-        pr = repo.get_pull(pr_number)
-        pr.create_review(event="APPROVE", body="Approved by AI Review Agent and user.")
+        token = await require_user_token(state)
+        owner_repo = repo_path(repo_url)
+        gh = GitHubClient(token)
+        await gh.post(
+            f"/repos/{owner_repo}/pulls/{pr_number}/reviews",
+            json={"event": "APPROVE", "body": "Approved by AI Review Agent and user."}
+        )
         return {"status": "approved"}
     except Exception as e:
         import traceback
@@ -247,10 +692,10 @@ async def approve_pr(repo_url: str, pr_number: int, state: str):
 @app.get("/api/github-user")
 async def github_user(state: str):
     try:
-        token = require_user_token(state)
-        gh = Github(token)
-        user = gh.get_user()
-        return {"login": user.login, "name": user.name, "avatar_url": user.avatar_url}
+        token = await require_user_token(state)
+        gh = GitHubClient(token)
+        user = await gh.get("/user")
+        return {"login": user["login"], "name": user["name"], "avatar_url": user["avatar_url"]}
     except Exception as e:
         import traceback
         traceback.print_exc()
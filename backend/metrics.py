@@ -0,0 +1,246 @@
+"""
+In-process metrics in the Prometheus text format, and an opt-in span-tree
+profiler for slow requests. No client library needed: series are plain dicts
+keyed by label values.
+"""
+import contextvars
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Requests slower than this are dumped as a span tree to stderr; unset disables profiling
+PROFILE_SLOW_MS = os.environ.get("PROFILE_SLOW_MS")
+# Lets clients force a dump with an `X-Profile: 1` header; off by default so nobody can flood the logs
+PROFILE_ALLOW_HEADER = os.environ.get("PROFILE_ALLOW_HEADER", "0") == "1"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join('%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values))
+    return "{%s}" % pairs
+
+
+def series_key(item):
+    return tuple(str(v) for v in item[0])
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        lines = self.header()
+        for values, value in sorted(self.series.items(), key=series_key):
+            lines.append(f"{self.name}{format_labels(self.labels, values)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *values, amount=1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def set(self, *values, value):
+        """For counters kept elsewhere (e.g. cache hits) and copied in at scrape time."""
+        self.series[values] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *values, value):
+        self.series[values] = value
+
+    def inc(self, *values, amount=1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def dec(self, *values, amount=1):
+        self.inc(*values, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, *values, value):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = self.header()
+        for values, series in sorted(self.series.items(), key=series_key):
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), values + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), values + ('+Inf',))} {series['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {round(series['sum'], 6)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {series['count']}")
+        return lines
+
+
+class Registry:
+    """Holds the metrics plus collectors, callables that refresh gauges from other modules at scrape time."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        for fn in self.collectors:
+            fn()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.add(Counter(
+    "http_requests_total", "Requests handled, by route and status.", ("method", "route", "status")))
+http_duration = registry.add(Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route")))
+http_in_flight = registry.add(Gauge(
+    "http_requests_in_flight", "Requests currently being handled, by route.", ("method", "route")))
+upstream_requests = registry.add(Counter(
+    "upstream_requests_total", "Calls to GitHub and Groq, by upstream route and status.", ("upstream", "method", "route", "status")))
+upstream_duration = registry.add(Histogram(
+    "upstream_request_duration_seconds", "Upstream call latency by route.", ("upstream", "method", "route")))
+llm_tokens = registry.add(Counter(
+    "llm_tokens_total", "LLM tokens used, by model and kind (prompt or completion).", ("model", "kind")))
+review_diff_tokens = registry.add(Counter(
+    "review_diff_tokens_total", "Estimated diff tokens of uncached reviews, before and after pre-filtering.", ("stage",)))
+
+# Sampled from other modules by collectors
+upstream_in_flight = registry.add(Gauge(
+    "upstream_requests_in_flight", "Upstream calls currently open, by pool.", ("upstream",)))
+cache_hits = registry.add(Counter("cache_hits_total", "Cache hits, including revalidations.", ("cache",)))
+cache_misses = registry.add(Counter("cache_misses_total", "Cache misses.", ("cache",)))
+cache_hit_ratio = registry.add(Gauge("cache_hit_ratio", "Share of lookups served from the cache.", ("cache",)))
+cache_entries = registry.add(Gauge("cache_entries", "Entries currently cached.", ("cache",)))
+rate_limit_remaining = registry.add(Gauge(
+    "github_rate_limit_remaining", "Requests left in the current window, by hashed token and resource.", ("token", "resource")))
+rate_limit_limit = registry.add(Gauge(
+    "github_rate_limit_limit", "Size of the rate-limit window.", ("token", "resource")))
+rate_limit_reset = registry.add(Gauge(
+    "github_rate_limit_reset_seconds", "Seconds until the rate-limit window resets.", ("token", "resource")))
+scheduler_queued = registry.add(Gauge(
+    "github_scheduler_queued", "Calls waiting for a slot, by priority.", ("token", "resource", "priority")))
+review_jobs_queued = registry.add(Gauge("review_jobs_queued", "Review jobs waiting for a worker."))
+git_mirror_bytes = registry.add(Gauge("git_mirror_bytes", "Disk used by local git mirrors."))
+git_mirror_fetches = registry.add(Counter(
+    "git_mirror_fetches_total", "Mirror syncs, by result (fetched, up_to_date or evicted).", ("result",)))
+
+
+# Upstream paths are templated so owners, numbers and SHAs don't explode the label space
+_REPO_PATH = re.compile(r"^/repos/[^/]+/[^/]+")
+_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+
+def route_template(path):
+    # Pagination follows absolute next links, so drop any scheme, host and query
+    path = _REPO_PATH.sub("/repos/{owner}/{repo}", urlsplit(path).path)
+    parts = []
+    for part in path.split("/"):
+        if _SHA.match(part):
+            part = "{sha}"
+        elif part.isdigit():
+            part = "{id}"
+        parts.append(part)
+    return "/".join(parts)
+
+
+def observe_upstream(upstream, method, url, status, seconds):
+    route = route_template(str(url))
+    upstream_requests.inc(upstream, method, route, status)
+    upstream_duration.observe(upstream, method, route, value=seconds)
+
+
+# Profiling
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def lines(self, origin=None, depth=0):
+        origin = self.start if origin is None else origin
+        yield f"{'  ' * depth}{self.name}  +{(self.start - origin) * 1000:.1f}ms  {self.duration * 1000:.1f}ms"
+        for child in self.children:
+            yield from child.lines(origin, depth + 1)
+
+
+@contextmanager
+def span(name):
+    """Records a child span of the current request's profile; a no-op when nothing is being profiled."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+@contextmanager
+def profile(name, force=False):
+    """
+    Profiles the enclosed request when PROFILE_SLOW_MS is set (or `force`),
+    printing its span tree if it took longer than the threshold.
+    """
+    if PROFILE_SLOW_MS is None and not force:
+        yield None
+        return
+    root = Span(name)
+    token = _current_span.set(root)
+    try:
+        yield root
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+        if force or root.duration * 1000 >= float(PROFILE_SLOW_MS):
+            print("\n".join(root.lines()), file=sys.stderr)
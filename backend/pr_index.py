@@ -0,0 +1,283 @@
+import asyncio
+import json
+import sqlite3
+import time
+import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    repo TEXT PRIMARY KEY,
+    webhook_at REAL,
+    seeded_at REAL
+);
+CREATE TABLE IF NOT EXISTS pulls (
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    title TEXT, author TEXT, body TEXT, url TEXT,
+    state TEXT NOT NULL,
+    head_sha TEXT, head_ref TEXT,
+    commit_count INTEGER,
+    labels TEXT, pr_updated_at TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (repo, number)
+);
+CREATE INDEX IF NOT EXISTS pulls_open ON pulls (repo, state, number);
+CREATE TABLE IF NOT EXISTS commits (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    statuses_complete INTEGER NOT NULL DEFAULT 0,
+    checks_complete INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (repo, sha)
+);
+CREATE TABLE IF NOT EXISTS statuses (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    context TEXT NOT NULL,
+    state TEXT, description TEXT, target_url TEXT, created_at TEXT,
+    PRIMARY KEY (repo, sha, context)
+);
+CREATE TABLE IF NOT EXISTS check_runs (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    name TEXT, status TEXT, conclusion TEXT,
+    summary TEXT, details_url TEXT, annotations_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS check_runs_sha ON check_runs (repo, sha);
+"""
+
+def combined_state(states):
+    """GitHub's combined status: failure beats pending beats success; no statuses is pending."""
+    if any(s in ("error", "failure") for s in states):
+        return "failure"
+    if not states or any(s == "pending" for s in states):
+        return "pending"
+    return "success"
+
+
+class PRIndex:
+    """
+    Local SQLite copy of open PRs, head SHAs, commit statuses and check runs,
+    kept current by GitHub webhooks. A repo is only served from the index once
+    it has received a webhook and its open PRs have been seeded from a live
+    listing; a commit's statuses or checks only once they are known to be
+    complete, i.e. the commit was first seen through a webhook or was seeded live.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    async def _run(self, fn, *args):
+        with metrics.span(f"pr_index{fn.__name__}"):
+            return await asyncio.to_thread(fn, *args)
+
+    # Repo tracking
+
+    def _repo_state(self, repo):
+        with self._connect() as db:
+            row = db.execute("SELECT webhook_at, seeded_at FROM repos WHERE repo = ?", (repo,)).fetchone()
+        return row or (None, None)
+
+    async def is_tracked(self, repo):
+        webhook_at, _ = await self._run(self._repo_state, repo)
+        return webhook_at is not None
+
+    async def is_ready(self, repo):
+        webhook_at, seeded_at = await self._run(self._repo_state, repo)
+        return webhook_at is not None and seeded_at is not None
+
+    # Pull requests
+
+    def _seed_pulls(self, repo, prs):
+        now = time.time()
+        with self._connect() as db:
+            # Anything not in a full live listing is no longer open
+            db.execute("UPDATE pulls SET state = 'closed' WHERE repo = ? AND state = 'open'", (repo,))
+            for pr in prs:
+                self._upsert_pull(db, repo, pr, "open", now)
+            db.execute(
+                "INSERT INTO repos (repo, seeded_at) VALUES (?, ?) ON CONFLICT(repo) DO UPDATE SET seeded_at = excluded.seeded_at",
+                (repo, now),
+            )
+
+    async def seed_pulls(self, repo, prs):
+        """Replaces the open PRs of `repo` with a complete live listing (PR_FIELDS dicts)."""
+        await self._run(self._seed_pulls, repo, prs)
+
+    @staticmethod
+    def _upsert_pull(db, repo, pr, state, now):
+        db.execute(
+            "INSERT OR REPLACE INTO pulls (repo, number, title, author, body, url, state, head_sha, head_ref, commit_count,"
+            " labels, pr_updated_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (repo, pr["number"], pr.get("title"), pr.get("author"), pr.get("body"), pr.get("url"), state,
+             pr.get("head_sha"), pr.get("head_ref"), pr.get("commit_count"), json.dumps(pr.get("labels") or []),
+             pr.get("updated_at"), now),
+        )
+
+    def _open_pulls(self, repo, limit, offset):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT number, title, author, body, url, commit_count, head_sha, head_ref, labels, pr_updated_at FROM pulls"
+                " WHERE repo = ? AND state = 'open' ORDER BY number DESC LIMIT ? OFFSET ?",
+                (repo, limit, offset),
+            ).fetchall()
+        keys = ("number", "title", "author", "body", "url", "commit_count", "head_sha", "head_ref", "labels", "updated_at")
+        prs = [dict(zip(keys, row)) for row in rows]
+        for pr in prs:
+            pr["labels"] = json.loads(pr["labels"] or "[]")
+        return prs
+
+    async def open_pulls(self, repo, limit=-1, offset=0):
+        return await self._run(self._open_pulls, repo, limit, offset)
+
+    def _head_sha(self, repo, number):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT head_sha FROM pulls WHERE repo = ? AND number = ? AND state = 'open'", (repo, number)
+            ).fetchone()
+        return row[0] if row else None
+
+    async def head_sha(self, repo, number):
+        return await self._run(self._head_sha, repo, number)
+
+    # Statuses and check runs
+
+    def _load_statuses(self, repo, sha):
+        with self._connect() as db:
+            complete = db.execute("SELECT statuses_complete FROM commits WHERE repo = ? AND sha = ?", (repo, sha)).fetchone()
+            if not complete or not complete[0]:
+                return None
+            rows = db.execute(
+                "SELECT context, state, description, target_url, created_at FROM statuses WHERE repo = ? AND sha = ? ORDER BY context",
+                (repo, sha),
+            ).fetchall()
+        checks = [dict(zip(("context", "state", "description", "target_url", "created_at"), row)) for row in rows]
+        return {"state": combined_state([c["state"] for c in checks]), "checks": checks}
+
+    async def statuses(self, repo, sha):
+        """The /api/pr-status payload for `sha`, or None if the index can't vouch for it."""
+        return await self._run(self._load_statuses, repo, sha)
+
+    def _load_check_runs(self, repo, sha):
+        with self._connect() as db:
+            complete = db.execute("SELECT checks_complete FROM commits WHERE repo = ? AND sha = ?", (repo, sha)).fetchone()
+            if not complete or not complete[0]:
+                return None
+            rows = db.execute(
+                "SELECT id, name, status, conclusion, summary, details_url, annotations_count FROM check_runs"
+                " WHERE repo = ? AND sha = ? ORDER BY id",
+                (repo, sha),
+            ).fetchall()
+        return [
+            {
+                "id": run_id,
+                "name": name,
+                "status": status,
+                "conclusion": conclusion,
+                "details_url": details_url,
+                "output": {"summary": summary, "annotations_count": annotations_count or 0},
+            }
+            for run_id, name, status, conclusion, summary, details_url, annotations_count in rows
+        ]
+
+    async def check_runs(self, repo, sha):
+        """Check runs of `sha`, shaped like the GitHub API's, or None if the index can't vouch for them."""
+        return await self._run(self._load_check_runs, repo, sha)
+
+    @staticmethod
+    def _mark_commit(db, repo, sha, statuses=False, checks=False):
+        db.execute("INSERT OR IGNORE INTO commits (repo, sha) VALUES (?, ?)", (repo, sha))
+        if statuses:
+            db.execute("UPDATE commits SET statuses_complete = 1 WHERE repo = ? AND sha = ?", (repo, sha))
+        if checks:
+            db.execute("UPDATE commits SET checks_complete = 1 WHERE repo = ? AND sha = ?", (repo, sha))
+
+    @staticmethod
+    def _upsert_status(db, repo, sha, status):
+        db.execute(
+            "INSERT OR REPLACE INTO statuses (repo, sha, context, state, description, target_url, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (repo, sha, status["context"], status["state"], status.get("description"), status.get("target_url"), status.get("created_at")),
+        )
+
+    @staticmethod
+    def _upsert_check_run(db, repo, run):
+        output = run.get("output") or {}
+        db.execute(
+            "INSERT OR REPLACE INTO check_runs (id, repo, sha, name, status, conclusion, summary, details_url, annotations_count)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run["id"], repo, run["head_sha"], run.get("name"), run.get("status"), run.get("conclusion"),
+             output.get("summary"), run.get("details_url"), output.get("annotations_count")),
+        )
+
+    def _seed_statuses(self, repo, sha, statuses):
+        with self._connect() as db:
+            for status in statuses:
+                self._upsert_status(db, repo, sha, status)
+            self._mark_commit(db, repo, sha, statuses=True)
+
+    async def seed_statuses(self, repo, sha, statuses):
+        await self._run(self._seed_statuses, repo, sha, statuses)
+
+    def _seed_check_runs(self, repo, sha, runs):
+        with self._connect() as db:
+            for run in runs:
+                self._upsert_check_run(db, repo, {**run, "head_sha": sha})
+            self._mark_commit(db, repo, sha, checks=True)
+
+    async def seed_check_runs(self, repo, sha, runs):
+        """Stores raw check-run objects from a complete live listing for `sha`."""
+        await self._run(self._seed_check_runs, repo, sha, runs)
+
+    # Webhooks
+
+    def _apply_event(self, event, payload):
+        repo = (payload.get("repository") or {}).get("full_name")
+        if not repo:
+            return False
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO repos (repo, webhook_at) VALUES (?, ?) ON CONFLICT(repo) DO UPDATE SET webhook_at = excluded.webhook_at",
+                (repo, now),
+            )
+            if event == "pull_request":
+                pr = payload["pull_request"]
+                self._upsert_pull(db, repo, {
+                    "number": pr["number"],
+                    "title": pr["title"],
+                    "author": (pr.get("user") or {}).get("login", ""),
+                    "body": pr.get("body"),
+                    "url": pr["html_url"],
+                    "head_sha": pr["head"]["sha"],
+                    "head_ref": pr["head"]["ref"],
+                    "commit_count": pr.get("commits"),
+                    "labels": [label["name"] for label in pr.get("labels") or []],
+                    "updated_at": pr.get("updated_at"),
+                }, pr["state"], now)
+                if payload.get("action") in ("opened", "reopened", "synchronize"):
+                    # Every status and check of a brand-new head will arrive as a webhook
+                    self._mark_commit(db, repo, pr["head"]["sha"], statuses=True, checks=True)
+            elif event == "push":
+                # Only the commit is recorded: a branch name alone can't tell a PR's head from a
+                # fork's branch of the same name, and PR heads move with pull_request synchronize
+                after = payload.get("after")
+                if after and set(after) != {"0"}:
+                    self._mark_commit(db, repo, after, statuses=True, checks=True)
+            elif event == "status":
+                self._upsert_status(db, repo, payload["sha"], payload)
+            elif event == "check_run":
+                self._upsert_check_run(db, repo, payload["check_run"])
+            else:
+                return False
+        return True
+
+    async def apply_event(self, event, payload):
+        """Applies one webhook delivery; returns False for events the index ignores."""
+        return await self._run(self._apply_event, event, payload)
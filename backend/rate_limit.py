@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import os
+import time
+import metrics
+
+INTERACTIVE, NORMAL, BULK = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk"}
+
+GITHUB_MAX_CONCURRENCY = int(os.environ.get("GITHUB_MAX_CONCURRENCY", "16"))
+# Share of the hourly budget that bulk work may not touch, kept for interactive use
+RATE_LIMIT_RESERVE = float(os.environ.get("GITHUB_RATE_LIMIT_RESERVE", "0.1"))
+# Below this share of the budget, non-interactive calls are paced to last until the reset
+RATE_LIMIT_LOW_WATER = float(os.environ.get("GITHUB_RATE_LIMIT_LOW_WATER", "0.25"))
+# Longest a request may wait for budget before failing instead
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("GITHUB_RATE_LIMIT_MAX_WAIT", "30"))
+PACING_BURST = 5
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, wait):
+        super().__init__(f"GitHub rate limit budget exhausted, retry in {int(wait) + 1}s")
+        self.wait = wait
+
+
+class TokenBudget:
+    """
+    Rate-limit state of one token for one GitHub resource ("core" or "graphql").
+    Concurrency slots are handed out by priority; the concurrency cap halves on
+    secondary rate limits and grows back by one per successful response.
+    """
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency or GITHUB_MAX_CONCURRENCY
+        self.concurrency = self.max_concurrency
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0
+        self.blocked_until = 0.0
+        self.active = 0
+        self.waiters = []
+        self.counter = itertools.count()
+        self.bucket = PACING_BURST
+        self.bucket_updated = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+
+    def wait_time(self, priority, now):
+        """Seconds this priority must wait before spending budget; 0 means go now."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.remaining is None or self.limit is None:
+            return 0.0
+        until_reset = max(self.reset - now, 0.0)
+        if self.remaining <= 0:
+            return until_reset
+        if priority == INTERACTIVE:
+            return 0.0
+        if priority == BULK and self.remaining <= self.limit * RATE_LIMIT_RESERVE:
+            return until_reset
+        if self.remaining < self.limit * RATE_LIMIT_LOW_WATER and until_reset > 0:
+            # Token bucket refilled at the rate that spreads what is left until the reset
+            rate = self.remaining / until_reset
+            mono = time.monotonic()
+            self.bucket = min(PACING_BURST, self.bucket + (mono - self.bucket_updated) * rate)
+            self.bucket_updated = mono
+            if self.bucket < 1:
+                return (1 - self.bucket) / rate
+            self.bucket -= 1
+        return 0.0
+
+    async def acquire(self, priority):
+        # Wait for budget before queueing for a slot, so paced bulk calls never
+        # sit on slots that interactive calls could use
+        while True:
+            wait = self.wait_time(priority, time.time())
+            if wait <= 0:
+                break
+            if wait > RATE_LIMIT_MAX_WAIT:
+                raise RateLimitExceeded(wait)
+            self.throttled += 1
+            await asyncio.sleep(wait)
+        if self.active >= self.concurrency or self.waiters:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (priority, next(self.counter), waiter))
+            try:
+                # wake() hands a slot straight to us
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+        else:
+            self.active += 1
+        self.requests += 1
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def release(self):
+        self.active -= 1
+        self.wake()
+
+    def wake(self):
+        """Hands free slots to the most urgent waiters."""
+        while self.active < self.concurrency and self.waiters:
+            _, _, waiter = heapq.heappop(self.waiters)
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def update(self, headers, retry_delay=None):
+        """Records the rate-limit headers of a response, and a back-off if it was rejected."""
+        if "X-RateLimit-Remaining" in headers:
+            self.remaining = int(headers["X-RateLimit-Remaining"])
+            self.limit = int(headers.get("X-RateLimit-Limit", self.limit or 0)) or None
+            self.reset = float(headers.get("X-RateLimit-Reset", self.reset))
+        if retry_delay is not None:
+            self.blocked_until = max(self.blocked_until, time.time() + retry_delay)
+            self.concurrency = max(1, self.concurrency // 2)
+        elif self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self.wake()
+
+    def stats(self):
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, waiter in self.waiters:
+            if not waiter.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+        now = time.time()
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_in": max(round(self.reset - now), 0) if self.reset else None,
+            "blocked_for": max(round(self.blocked_until - now, 1), 0),
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queued": queued,
+            "requests": self.requests,
+            "throttled": self.throttled,
+        }
+
+
+class Slot:
+    def __init__(self, budget, priority):
+        self.budget = budget
+        self.priority = priority
+
+    async def __aenter__(self):
+        with metrics.span(f"rate-limit wait ({PRIORITY_NAMES[self.priority]})"):
+            await self.budget.acquire(self.priority)
+        return self.budget
+
+    async def __aexit__(self, *exc):
+        self.budget.release()
+
+
+class RateLimitScheduler:
+    """Central gate for GitHub calls: one TokenBudget per (token, resource)."""
+
+    def __init__(self):
+        self.budgets = {}
+
+    @staticmethod
+    def token_key(token):
+        return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+    def budget(self, token, resource="core"):
+        key = (self.token_key(token), resource)
+        budget = self.budgets.get(key)
+        if budget is None:
+            budget = self.budgets[key] = TokenBudget()
+        return budget
+
+    def slot(self, token, priority=INTERACTIVE, resource="core"):
+        return Slot(self.budget(token, resource), priority)
+
+    def stats(self, token):
+        key = self.token_key(token)
+        return {resource: budget.stats() for (k, resource), budget in self.budgets.items() if k == key}
+
+
+scheduler = RateLimitScheduler()
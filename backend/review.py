@@ -0,0 +1,345 @@
+import asyncio
+import json
+import os
+import time
+import metrics
+from diff_filter import CONFIG_VERSION, estimate_tokens, split_hunks
+from http_pools import get_pool
+from review_cache import content_hash
+
+# Diff budget per LLM call; kept well under the model context to leave room for the reply
+REVIEW_CHUNK_TOKENS = int(os.environ.get("REVIEW_CHUNK_TOKENS", "6000"))
+# Average files per chunk; chunks end at files picked by name, so editing one file leaves other chunks as they were
+REVIEW_CHUNK_FILES = int(os.environ.get("REVIEW_CHUNK_FILES", "8"))
+REVIEW_CONCURRENCY = int(os.environ.get("REVIEW_CONCURRENCY", "4"))
+REVIEW_MAX_TOKENS = int(os.environ.get("REVIEW_MAX_TOKENS", "512"))
+# Groq calls in flight across the whole process, whatever mix of reviews and batches issues them
+GROQ_CONCURRENCY = int(os.environ.get("GROQ_CONCURRENCY", "8"))
+GROQ_RATE_LIMIT_RETRIES = int(os.environ.get("GROQ_RATE_LIMIT_RETRIES", "3"))
+
+
+class GroqSlots:
+    """
+    Process-wide cap on Groq calls in flight. A rate-limited call pauses every
+    caller until its Retry-After has passed, so waiting calls don't pile into
+    the same rejection.
+    """
+
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.resume_at = 0.0
+
+    def back_off(self, delay):
+        self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            # Checked while holding a slot, in case a back-off began while waiting for it
+            while time.monotonic() < self.resume_at:
+                await asyncio.sleep(self.resume_at - time.monotonic())
+        except BaseException:
+            # A caller cancelled mid back-off never reaches __aexit__; give the slot back here
+            self.semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+groq_slots = GroqSlots(GROQ_CONCURRENCY)
+
+
+REVIEW_PROMPT = """You are a senior software engineer. Review the following GitHub pull request diff for code quality, bugs, and improvement suggestions. Reply in concise bullet points.
+{diff}
+"""
+
+MERGE_PROMPT = """You are a senior software engineer. The following are reviews of different parts of one GitHub pull request. Merge them into a single review in concise bullet points, removing duplicates and keeping the most important findings first.
+{reviews}
+"""
+
+
+def groq_retry_delay(resp, attempt):
+    """Seconds to wait before retrying a rate-limited (429) Groq response, or None to not retry."""
+    if resp.status_code != 429:
+        return None
+    retry_after = resp.headers.get("Retry-After")
+    return float(retry_after) if retry_after else 2 ** attempt
+
+
+def split_lines(text, budget):
+    """Last resort for a single hunk over budget: cut it at line boundaries."""
+    pieces = []
+    current = ""
+    lines = []
+    for line in text.splitlines(keepends=True):
+        # Minified or generated lines can exceed the budget on their own
+        lines.extend(line[i:i + budget * 4] for i in range(0, len(line), budget * 4))
+    for line in lines:
+        if current and estimate_tokens(current + line) > budget:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def file_sections(filename, patch, budget):
+    """Renders one file's patch as one or more sections that each fit `budget`."""
+    section = f"\n# File: {filename}\n{patch}\n"
+    if estimate_tokens(section) <= budget:
+        return [section]
+    sections = []
+    header_budget = budget - estimate_tokens(f"\n# File: {filename} (part 999)\n\n")
+    parts = []
+    for hunk in split_hunks(patch):
+        parts.extend([hunk] if estimate_tokens(hunk) <= header_budget else split_lines(hunk, header_budget))
+    current = ""
+    for part in parts:
+        if current and estimate_tokens(current + part) > header_budget:
+            sections.append(current)
+            current = ""
+        current += part
+    if current:
+        sections.append(current)
+    return [f"\n# File: {filename} (part {i})\n{s}\n" for i, s in enumerate(sections, 1)]
+
+
+def ends_chunk(filename, files_per_chunk):
+    """Content-defined boundary: about one file in `files_per_chunk`, chosen by name alone."""
+    return int(content_hash("boundary", filename)[:8], 16) % files_per_chunk == 0
+
+
+class ChunkPacker:
+    """
+    Packs (filename, patch) pairs into diff chunks of at most `budget` tokens.
+    Small files share a chunk; large files are split by hunk, then by line.
+    With `files_per_chunk`, a chunk also always ends after a file picked by
+    ends_chunk(), so a file growing or shrinking only moves the boundaries up
+    to the next such file instead of every later one, and the other chunks keep
+    their cached reviews.
+    """
+
+    def __init__(self, budget=None, files_per_chunk=None):
+        self.budget = budget or REVIEW_CHUNK_TOKENS
+        self.files_per_chunk = files_per_chunk
+        self.current = ""
+
+    def add(self, filename, patch):
+        """Adds one file and returns the chunks it completed."""
+        done = []
+        for section in file_sections(filename, patch, self.budget):
+            if self.current and estimate_tokens(self.current + section) > self.budget:
+                done.append(self.current)
+                self.current = ""
+            self.current += section
+        if self.current and self.files_per_chunk and ends_chunk(filename, self.files_per_chunk):
+            done.append(self.current)
+            self.current = ""
+        return done
+
+    def finish(self):
+        """Returns the last, partly filled chunk, if any."""
+        done = [self.current] if self.current else []
+        self.current = ""
+        return done
+
+
+async def iter_chunks(files, budget=None, files_per_chunk=None):
+    """Async version of chunk_diff(): consumes (filename, patch) pairs as they arrive."""
+    packer = ChunkPacker(budget, files_per_chunk)
+    async for filename, patch in files:
+        for chunk in packer.add(filename, patch):
+            yield chunk
+    for chunk in packer.finish():
+        yield chunk
+
+
+def chunk_diff(files, budget=None, files_per_chunk=None):
+    """Packs (filename, patch) pairs into a list of chunks; see ChunkPacker."""
+    packer = ChunkPacker(budget, files_per_chunk)
+    chunks = []
+    for filename, patch in files:
+        chunks.extend(packer.add(filename, patch))
+    return chunks + packer.finish()
+
+
+class GroqReviewer:
+    """
+    Map-reduce LLM review: chunks are reviewed concurrently, then merged.
+    With a ReviewCache, finished reviews are reused per (repo, head SHA) and
+    chunk reviews per chunk content. Chunk boundaries don't depend on other
+    files' sizes (see ChunkPacker), so a new push only re-reviews the chunks
+    holding files whose diff actually changed.
+    """
+
+    def __init__(self, api_key, model, concurrency=None, chunk_tokens=None, max_tokens=None, cache=None,
+                 chunk_files=None):
+        self.api_key = api_key
+        self.model = model
+        self.concurrency = concurrency or REVIEW_CONCURRENCY
+        self.chunk_tokens = chunk_tokens or REVIEW_CHUNK_TOKENS
+        self.chunk_files = chunk_files or REVIEW_CHUNK_FILES
+        self.max_tokens = max_tokens or REVIEW_MAX_TOKENS
+        self.cache = cache
+        # Any change to the prompts or limits invalidates previously cached reviews
+        self.prompt_version = content_hash(REVIEW_PROMPT, MERGE_PROMPT, self.chunk_tokens, self.max_tokens, CONFIG_VERSION)
+
+    def review_key(self, owner_repo, head_sha):
+        return content_hash("review", owner_repo, head_sha, self.model, self.prompt_version)
+
+    def chunk_key(self, chunk):
+        return content_hash("chunk", self.model, self.prompt_version, chunk)
+
+    def record_usage(self, usage, prompt, output):
+        """Counts LLM tokens, estimating them when the response carries no usage block."""
+        usage = usage or {}
+        metrics.llm_tokens.inc(self.model, "prompt", amount=usage.get("prompt_tokens") or estimate_tokens(prompt))
+        metrics.llm_tokens.inc(self.model, "completion", amount=usage.get("completion_tokens") or estimate_tokens(output))
+
+    def completion_request(self, prompt, stream=False):
+        body = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens
+        }
+        if stream:
+            body["stream"] = True
+        return {
+            "headers": {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            "json": body,
+        }
+
+    async def stream_complete(self, prompt, on_token):
+        """Like complete(), but passes each generated token to `on_token` as it arrives."""
+        for attempt in range(GROQ_RATE_LIMIT_RETRIES + 1):
+            async with groq_slots:
+                async with get_pool("groq").stream("POST", "/chat/completions", **self.completion_request(prompt, True)) as resp:
+                    delay = groq_retry_delay(resp, attempt)
+                    if delay is None or attempt == GROQ_RATE_LIMIT_RETRIES:
+                        resp.raise_for_status()
+                        return await self.read_stream(resp, prompt, on_token)
+            # Rejected before any token was produced, so retrying is safe
+            groq_slots.back_off(delay)
+
+    async def read_stream(self, resp, prompt, on_token):
+        parts = []
+        usage = None
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            # Groq reports usage on the last chunk, under x_groq
+            usage = event.get("usage") or event.get("x_groq", {}).get("usage") or usage
+            if not event.get("choices"):
+                continue
+            token = event["choices"][0].get("delta", {}).get("content")
+            if token:
+                parts.append(token)
+                await on_token(token)
+        output = "".join(parts).strip()
+        self.record_usage(usage, prompt, output)
+        return output
+
+    async def cached_complete(self, key, prompt, on_token=None):
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                if on_token:
+                    await on_token(cached)
+                return cached
+        if on_token:
+            output = await self.stream_complete(prompt, on_token)
+        else:
+            output = await self.complete(prompt)
+        if self.cache is not None:
+            await self.cache.put(key, output)
+        return output
+
+    async def complete(self, prompt):
+        for attempt in range(GROQ_RATE_LIMIT_RETRIES + 1):
+            async with groq_slots:
+                resp = await get_pool("groq").post("/chat/completions", **self.completion_request(prompt))
+            delay = groq_retry_delay(resp, attempt)
+            if delay is None or attempt == GROQ_RATE_LIMIT_RETRIES:
+                break
+            groq_slots.back_off(delay)
+        resp.raise_for_status()
+        data = resp.json()
+        output = data["choices"][0]["message"]["content"].strip()
+        self.record_usage(data.get("usage"), prompt, output)
+        return output
+
+    async def review_chunks(self, chunks, on_token=None, on_progress=None):
+        """Reviews chunks concurrently; `on_progress(done, total)` is awaited as each one finishes."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # A lone chunk's review is the final answer, so it is the one worth streaming
+        on_token = on_token if len(chunks) == 1 else None
+        done = 0
+
+        async def review(chunk):
+            nonlocal done
+            async with semaphore:
+                output = await self.cached_complete(
+                    self.chunk_key(chunk), REVIEW_PROMPT.format(diff=chunk), on_token
+                )
+            done += 1
+            if on_progress:
+                await on_progress(done, len(chunks))
+            return output
+
+        return await asyncio.gather(*[review(chunk) for chunk in chunks])
+
+    async def merge(self, reviews, on_token=None):
+        """Merges partial reviews, in several rounds if they don't fit one prompt."""
+        while len(reviews) > 1:
+            groups = chunk_diff([(f"Review {i}", r) for i, r in enumerate(reviews, 1)], self.chunk_tokens)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            stream_to = on_token if len(groups) == 1 else None
+
+            async def merge_group(group):
+                async with semaphore:
+                    prompt = MERGE_PROMPT.format(reviews=group)
+                    if stream_to:
+                        return await self.stream_complete(prompt, stream_to)
+                    return await self.complete(prompt)
+
+            merged = await asyncio.gather(*[merge_group(g) for g in groups])
+            if len(merged) >= len(reviews):
+                # Reviews too long to combine further; keep them side by side
+                return "\n\n".join(merged)
+            reviews = merged
+        return reviews[0]
+
+    async def cached_review(self, owner_repo, head_sha):
+        """Returns the stored review for this PR head, or None."""
+        if self.cache is None:
+            return None
+        return await self.cache.get(self.review_key(owner_repo, head_sha))
+
+    async def review(self, files, owner_repo=None, head_sha=None, on_token=None, on_progress=None):
+        """
+        Reviews (filename, patch) pairs, from a list or an async iterable such
+        as diff_filter.prefilter(), and returns the merged review text.
+        Pass `owner_repo` and `head_sha` to store the result for cached_review(),
+        an async `on_token` callback to receive the final pass as it streams,
+        and an async `on_progress(done, total)` callback for reviewed chunks.
+        """
+        if hasattr(files, "__aiter__"):
+            chunks = [chunk async for chunk in iter_chunks(files, self.chunk_tokens, self.chunk_files)]
+        else:
+            chunks = chunk_diff(files, self.chunk_tokens, self.chunk_files)
+        if not chunks:
+            return "No changes with a textual diff to review."
+        reviews = await self.review_chunks(chunks, on_token, on_progress)
+        output = await self.merge(list(reviews), on_token)
+        if self.cache is not None and head_sha:
+            await self.cache.put(self.review_key(owner_repo, head_sha), output)
+        return output
@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import sqlite3
+import time
+
+
+def content_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ReviewCache:
+    """
+    Persistent, content-addressed store of LLM review text in SQLite.
+    Keys are hashes of everything that determines the output (repo, head SHA
+    or chunk text, model, prompt template). When the total stored size exceeds
+    `max_bytes`, least recently used entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS reviews ("
+                " key TEXT PRIMARY KEY, review TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS reviews_last_used ON reviews (last_used)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _get(self, key):
+        with self._connect() as db:
+            row = db.execute("SELECT review FROM reviews WHERE key = ?", (key,)).fetchone()
+            if row:
+                db.execute("UPDATE reviews SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def _put(self, key, review):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO reviews (key, review, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, review, len(review.encode()), now, now),
+            )
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM reviews").fetchone()[0]
+            while total > self.max_bytes:
+                row = db.execute("SELECT key, size FROM reviews ORDER BY last_used LIMIT 1").fetchone()
+                if row is None:
+                    break
+                db.execute("DELETE FROM reviews WHERE key = ?", (row[0],))
+                total -= row[1]
+
+    async def get(self, key):
+        review = await asyncio.to_thread(self._get, key)
+        if review is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return review
+
+    async def put(self, key, review):
+        await asyncio.to_thread(self._put, key, review)
+
+    def stats(self):
+        with self._connect() as db:
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reviews").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
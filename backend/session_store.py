@@ -0,0 +1,155 @@
+import asyncio
+import os
+import sqlite3
+import time
+from cache import LRUCache
+
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_TTL = float(os.environ.get("SESSION_TTL", str(24 * 3600)))
+# How long a worker trusts its local copy of a token before asking the shared store again
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", "5"))
+
+
+class MemorySessionStore:
+    """Per-process store: only correct with a single uvicorn worker."""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or SESSION_TTL
+        self._tokens = {}
+
+    async def get(self, state):
+        item = self._tokens.get(state)
+        if item is None:
+            return None
+        token, expires_at = item
+        if expires_at < time.time():
+            del self._tokens[state]
+            return None
+        return token
+
+    async def set(self, state, token):
+        now = time.time()
+        for expired in [s for s, (_, expires_at) in self._tokens.items() if expires_at < now]:
+            del self._tokens[expired]
+        self._tokens[state] = (token, now + self.ttl)
+
+    async def delete(self, state):
+        self._tokens.pop(state, None)
+
+    async def close(self):
+        pass
+
+
+class SQLiteSessionStore:
+    """Shared store for several workers on one host, using a WAL-mode SQLite file."""
+
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl or SESSION_TTL
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (state TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _get(self, state):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT token FROM sessions WHERE state = ? AND expires_at >= ?", (state, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, state, token):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            db.execute("INSERT OR REPLACE INTO sessions (state, token, expires_at) VALUES (?, ?, ?)", (state, token, now + self.ttl))
+
+    def _delete(self, state):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE state = ?", (state,))
+
+    async def get(self, state):
+        return await asyncio.to_thread(self._get, state)
+
+    async def set(self, state, token):
+        await asyncio.to_thread(self._set, state, token)
+
+    async def delete(self, state):
+        await asyncio.to_thread(self._delete, state)
+
+    async def close(self):
+        pass
+
+
+class RedisSessionStore:
+    """Shared store across hosts for any Redis-protocol server. Requires the `redis` package."""
+
+    def __init__(self, url, ttl=None):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("SESSION_STORE=redis://... requires the 'redis' package")
+        self.ttl = ttl or SESSION_TTL
+        self.client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, state):
+        return await self.client.get(f"session:{state}")
+
+    async def set(self, state, token):
+        await self.client.set(f"session:{state}", token, ex=int(self.ttl))
+
+    async def delete(self, state):
+        await self.client.delete(f"session:{state}")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class CachedSessionStore:
+    """
+    Read-through cache in front of a shared store. Only found tokens are cached,
+    so a login that just happened on another worker is never hidden by a stale miss.
+    """
+
+    def __init__(self, store, cache_ttl=None, max_entries=1024):
+        self.store = store
+        self.cache_ttl = SESSION_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.cache = LRUCache(max_entries)
+
+    async def get(self, state):
+        cached = self.cache.get(state)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        token = await self.store.get(state)
+        if token is not None:
+            self.cache.put(state, (token, time.monotonic() + self.cache_ttl))
+        return token
+
+    async def set(self, state, token):
+        await self.store.set(state, token)
+        self.cache.put(state, (token, time.monotonic() + self.cache_ttl))
+
+    async def delete(self, state):
+        await self.store.delete(state)
+        self.cache.put(state, (None, 0))
+
+    async def close(self):
+        await self.store.close()
+
+
+def create_session_store(url=None):
+    """
+    Builds the store named by SESSION_STORE: "memory", "sqlite:///path/to/file"
+    or "redis://host:port/db". Shared stores get a local read-through cache.
+    """
+    url = url or SESSION_STORE
+    if url == "memory":
+        return MemorySessionStore()
+    if url.startswith("sqlite:///"):
+        return CachedSessionStore(SQLiteSessionStore(url[len("sqlite:///"):]))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return CachedSessionStore(RedisSessionStore(url))
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
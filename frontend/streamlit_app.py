@@ -1,7 +1,11 @@
+import json
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 
 BACKEND = "http://localhost:8000"
+PR_PAGE_SIZE = 20
+PR_LIST_FIELDS = "number,title,author,url,commit_count,head_sha"
 
 st.set_page_config(page_title="AI PR Review Agent", page_icon="🤖", layout="centered")
 st.title("🤖 AI PR Review Agent (GitHub)")
@@ -12,71 +16,361 @@ if "is_logged_in" not in st.session_state:
     st.session_state.is_logged_in = False
 if "prs" not in st.session_state:
     st.session_state.prs = []
-if "review" not in st.session_state:
-    st.session_state.review = ""
+if "next_cursor" not in st.session_state:
+    st.session_state.next_cursor = None
+if "reviews" not in st.session_state:
+    st.session_state.reviews = {}
+if "commits" not in st.session_state:
+    st.session_state.commits = {}
 if "repo_url" not in st.session_state:
     st.session_state.repo_url = ""
 if "user_info" not in st.session_state:
     st.session_state.user_info = {}
+if "bulk_batch_id" not in st.session_state:
+    st.session_state.bulk_batch_id = ""
 
 query_params = st.query_params
 if "state" in query_params:
     st.session_state.oauth_state = query_params["state"]
     st.session_state.is_logged_in = True
 
+state_icon = {
+    "success": "✅",
+    "failure": "❌",
+    "pending": "⏳",
+    "unknown": "❔"
+}
+status_icon2 = {
+    "success": "✅",
+    "failure": "❌",
+    "neutral": "🟡",
+    "cancelled": "🚫",
+    "timed_out": "⏱️",
+    "action_required": "⚠️"
+}
+
+@st.cache_resource
+def http_session():
+    """One keep-alive connection pool to the backend, shared by every rerun and user."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def api_get(path, timeout=30, **params):
+    # Errors raise instead of returning a fallback, so st.cache_data never caches them
+    resp = http_session().get(f"{BACKEND}{path}", params=params, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+def api_post(path, timeout=20, **params):
+    return http_session().post(f"{BACKEND}{path}", params=params, timeout=timeout)
+
+# Cached lookups take the OAuth state as an argument so users never share entries
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_github_user(state):
+    return api_get("/api/github-user", timeout=20, state=state)
+
 def get_github_user(state):
     try:
-        resp = requests.get(f"{BACKEND}/api/github-user", params={"state": state}, timeout=20)
-        if resp.ok:
-            return resp.json()
+        return fetch_github_user(state)
     except Exception as e:
         print("Error fetching user info:", e)
     return {}
 
-def get_pr_status(repo_url, pr_number, state):
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_pr_page(repo_url, state, cursor):
+    return api_get(
+        "/api/list-prs", timeout=60,
+        repo_url=repo_url, state=state, per_page=PR_PAGE_SIZE, cursor=cursor, fields=PR_LIST_FIELDS
+    )
+
+# Keyed on the head SHA, so a push shows up at once; the TTL only covers CI progress on one commit
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_pr_status(repo_url, pr_number, head_sha, state):
+    return api_get("/api/pr-status", timeout=20, repo_url=repo_url, pr_number=pr_number, state=state)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_pr_check_summaries(repo_url, pr_number, head_sha, state):
+    return api_get("/api/pr-check-summaries", repo_url=repo_url, pr_number=pr_number, state=state).get("checks", [])
+
+# One call covers the CI state of every open PR, so collapsed PRs cost nothing extra
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_pr_dashboard(repo_url, state):
+    return {pr["number"]: pr for pr in api_get("/api/pr-dashboard", timeout=60, repo_url=repo_url, state=state).get("prs", [])}
+
+def get_pr_dashboard(repo_url, state):
     try:
-        resp = requests.get(
-            f"{BACKEND}/api/pr-status",
-            params={"repo_url": repo_url, "pr_number": pr_number, "state": state},
-            timeout=20
-        )
-        if resp.ok:
-            return resp.json()
+        return fetch_pr_dashboard(repo_url, state)
+    except Exception as e:
+        print("Error fetching PR dashboard:", e)
+    return {}
+
+def get_pr_status(repo_url, pr_number, head_sha, state):
+    try:
+        return fetch_pr_status(repo_url, pr_number, head_sha, state)
     except Exception as e:
         print("Error fetching PR status:", e)
     return {"state": "unknown", "checks": []}
 
-def get_pr_check_summaries(repo_url, pr_number, state):
+def get_pr_check_summaries(repo_url, pr_number, head_sha, state):
     try:
-        resp = requests.get(
-            f"{BACKEND}/api/pr-check-summaries",
-            params={"repo_url": repo_url, "pr_number": pr_number, "state": state},
-            timeout=30
-        )
-        if resp.ok:
-            return resp.json().get("checks", [])
+        return fetch_pr_check_summaries(repo_url, pr_number, head_sha, state)
     except Exception as e:
         print("Error fetching check summaries:", e)
     return []
 
-def get_pr_commits_with_diffs(repo_url, pr_number, state):
+def start_bulk_review(repo_url, state, label, author, updated_since):
+    """Starts a review of every matching open PR; returns the batch id."""
+    params = {"repo_url": repo_url, "state": state}
+    for name, value in (("label", label), ("author", author), ("updated_since", updated_since)):
+        if value:
+            params[name] = value
+    resp = api_post("/api/bulk-reviews", timeout=60, **params)
+    resp.raise_for_status()
+    return resp.json()["batch_id"]
+
+def get_bulk_review(batch_id, state, include_reviews=False):
     try:
-        resp = requests.get(
-            f"{BACKEND}/api/pr-commits-with-diffs",
-            params={"repo_url": repo_url, "pr_number": pr_number, "state": state},
-            timeout=40
-        )
-        if resp.ok:
-            return resp.json().get("commits", [])
+        return api_get(f"/api/bulk-reviews/{batch_id}", state=state, include_reviews=include_reviews)
     except Exception as e:
-        print("Error fetching commits with diffs:", e)
-    return []
+        print("Error fetching bulk review:", e)
+    return {}
+
+def stream_pr_commits_with_diffs(repo_url, pr_number, state):
+    """
+    Yields commits one at a time as the backend streams them (NDJSON). Raises
+    if the stream fails part way, so a partial list is never taken as complete.
+    """
+    with http_session().get(
+        f"{BACKEND}/api/pr-commits-with-diffs",
+        params={"repo_url": repo_url, "pr_number": pr_number, "state": state, "stream": 1},
+        stream=True,
+        timeout=40
+    ) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            commit = json.loads(line)
+            if "error" in commit:
+                raise RuntimeError(commit["error"])
+            yield commit
+
+def stream_review_job(job_id, state, on_progress=None):
+    """
+    Yields review text from the backend's server-sent events as it is generated.
+    `on_progress(done, total)` is called as diff chunks are reviewed; the
+    backend's keepalive comments keep the read timeout from firing meanwhile.
+    """
+    with http_session().get(
+        f"{BACKEND}/api/reviews/{job_id}/events", params={"state": state}, stream=True, timeout=120
+    ) as resp:
+        resp.raise_for_status()
+        event = None
+        for line in resp.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "token":
+                    yield data
+                elif event == "progress":
+                    if on_progress and data:
+                        on_progress(data["chunks_done"], data["chunks_total"])
+                elif event == "error":
+                    raise RuntimeError(data)
+                elif event == "cancelled":
+                    raise RuntimeError("Review was cancelled")
+
+def load_prs(cursor=None):
+    """Fetches one page of open PRs and appends it to the list shown."""
+    try:
+        data = fetch_pr_page(st.session_state.repo_url, st.session_state.oauth_state, cursor)
+        st.session_state.prs.extend(data.get("prs", []))
+        st.session_state.next_cursor = data.get("next_cursor")
+    except Exception as e:
+        st.error(f"Error fetching PRs: {e}")
+
+def render_commit(c):
+    st.markdown(
+        f"**Commit `{c['sha'][:7]}` by `{c['author']}` on `{c['date'][:10]}`**<br/>"
+        f"<span style='color:#888'>{c['message']}</span>",
+        unsafe_allow_html=True
+    )
+    for f in c['files']:
+        st.markdown(
+            f"<details><summary>{f['filename']}</summary>\n\n"
+            f"```diff\n{f['patch']}\n```\n</details>",
+            unsafe_allow_html=True
+        )
+
+def render_ci_details(repo_url, pr, state):
+    pr_status = get_pr_status(repo_url, pr['number'], pr['head_sha'], state)
+    if pr_status.get("checks"):
+        st.markdown("**Status Checks:**")
+        for check in pr_status["checks"]:
+            st.markdown(
+                f"- **{check['context']}**: {state_icon.get(check['state'], '❔')} "
+                f"`{check['state']}` — {check['description'] or ''} "
+                f"[Details]({check['target_url']})"
+            )
+
+    # Show inline linter/test summaries and annotations
+    check_summaries = get_pr_check_summaries(repo_url, pr['number'], pr['head_sha'], state)
+    if check_summaries:
+        st.markdown("**Inline Lint/Test Results:**")
+        for run in check_summaries:
+            icon = status_icon2.get((run["status"] or "").lower(), "❔")
+            st.markdown(f"- **{run['title']}**: {icon} `{run['status']}`")
+            if run["summary"]:
+                st.code(run["summary"], language="markdown")
+            # Display each annotation inline:
+            if run.get("annotations"):
+                for anno in run["annotations"]:
+                    st.markdown(
+                        f"`{anno.get('path', 'file')}` "
+                        f"**L{anno.get('start_line', '?')}** "
+                        f"`{anno.get('annotation_level', '').upper()}` - "
+                        f"{anno.get('message', '')}"
+                    )
+            # Large annotation sets come back grouped by file
+            for path, annos in (run.get("annotations_by_file") or {}).items():
+                with st.expander(f"`{path}` ({len(annos)} annotations)"):
+                    for start_line, _, level, _, message in annos:
+                        st.markdown(f"**L{start_line}** `{(level or '').upper()}` - {message}")
+            if run.get("details_url"):
+                st.markdown(f"[Full Details]({run['details_url']})")
+
+@st.fragment
+def pr_panel(pr, ci):
+    """
+    One PR, with `ci` its entry from the dashboard. Details are only fetched
+    once it is opened, and as a fragment its buttons rerun only this panel.
+    """
+    repo_url = st.session_state.repo_url
+    state = st.session_state.oauth_state
+    number = pr['number']
+    ci = ci or {"state": "unknown", "checks": [], "check_runs": []}
+    icon = state_icon.get(ci['state'], '❔')
+    if not st.toggle(f"{icon} #{number}: {pr['title']} (by {pr['author']})", key=f"open_{number}"):
+        return
+    with st.container(border=True):
+        st.markdown(f"[View on GitHub]({pr['url']})")
+        st.markdown(f"**Commits in this PR:** `{pr.get('commit_count', '?')}`")
+
+        # Show latest CI status from the dashboard summary
+        st.markdown(f"**Latest CI Status:** {icon} `{ci['state']}`")
+        for check in ci.get("checks", []):
+            st.markdown(f"- **{check['context']}**: {state_icon.get(check['state'], '❔')} `{check['state']}`")
+        for run in ci.get("check_runs", []):
+            run_icon = status_icon2.get((run["status"] or "").lower(), "❔")
+            st.markdown(f"- **{run['title']}**: {run_icon} `{run['status']}`")
+
+        # Full status descriptions, summaries and annotations are only fetched on demand
+        if st.toggle("Show CI details", key=f"ci_details_{number}"):
+            render_ci_details(repo_url, pr, state)
+
+        # Commits of a head SHA never change, so they are kept for the session once loaded
+        commits_key = (number, pr['head_sha'])
+        if commits_key in st.session_state.commits:
+            for c in st.session_state.commits[commits_key]:
+                render_commit(c)
+        elif st.button(f"Show All Commits & Diffs for PR #{number}", key=f"commits_{number}"):
+            loaded = []
+            try:
+                for c in stream_pr_commits_with_diffs(repo_url, number, state):
+                    loaded.append(c)
+                    render_commit(c)
+            except Exception as e:
+                # Not kept, so the button stays available for another try
+                st.error(f"Loaded {len(loaded)} commits, then failed: {e}")
+            else:
+                st.session_state.commits[commits_key] = loaded
+                if not loaded:
+                    st.info("No commits found.")
+
+        # Review/Approve buttons
+        if st.button(f"Review PR #{number}", key=f"review_{number}"):
+            try:
+                r = api_post("/api/reviews", repo_url=repo_url, pr_number=number, state=state)
+                job = r.json() if r.headers.get('Content-Type', '').startswith('application/json') else {}
+                if job.get("job_id"):
+                    # Show tokens while the review is generated, then keep the final text
+                    placeholder = st.empty()
+                    progress = st.empty()
+
+                    def show_progress(done, total):
+                        progress.caption(f"Reviewed {done}/{total} parts of the diff…")
+
+                    with placeholder.container():
+                        review = st.write_stream(stream_review_job(job["job_id"], state, show_progress))
+                    placeholder.empty()
+                    progress.empty()
+                    st.session_state.reviews[number] = review or "No review returned."
+                elif "error" in job:
+                    st.session_state.reviews[number] = f"Error: {job['error']}"
+                else:
+                    st.session_state.reviews[number] = f"Error: {r.text}"
+            except Exception as e:
+                st.session_state.reviews[number] = f"Error fetching review: {e}"
+        review = st.session_state.reviews.get(number)
+        if review:
+            if review.startswith("Error"):
+                st.error(review)
+            else:
+                st.info(review)
+        if st.button(f"Approve PR #{number}", key=f"approve_{number}"):
+            try:
+                r = api_post("/api/approve-pr", repo_url=repo_url, pr_number=number, state=state)
+                if r.ok:
+                    st.success("PR Approved!")
+                else:
+                    st.error(f"Failed to approve PR: {r.text}")
+            except Exception as e:
+                st.error(f"Failed to approve PR: {e}")
+
+@st.fragment(run_every=5)
+def bulk_review_panel():
+    """Starts bulk reviews and polls their progress every few seconds while one is running."""
+    with st.expander("Review all open PRs"):
+        col1, col2, col3 = st.columns(3)
+        bulk_label = col1.text_input("Label", key="bulk_label")
+        bulk_author = col2.text_input("Author", key="bulk_author")
+        bulk_since = col3.text_input("Updated since", key="bulk_since", placeholder="2024-01-31")
+        if st.button("Start bulk review"):
+            try:
+                st.session_state.bulk_batch_id = start_bulk_review(
+                    st.session_state.repo_url, st.session_state.oauth_state, bulk_label, bulk_author, bulk_since
+                )
+                st.session_state.pop("bulk_batch", None)
+            except Exception as e:
+                st.error(f"Error starting bulk review: {e}")
+        if not st.session_state.bulk_batch_id:
+            return
+        batch = st.session_state.get("bulk_batch") or {}
+        # A finished batch never changes, so stop polling it
+        if batch.get("status") not in ("done", "cancelled", "interrupted", "error"):
+            batch = get_bulk_review(st.session_state.bulk_batch_id, st.session_state.oauth_state, include_reviews=True)
+            st.session_state.bulk_batch = batch
+        progress = batch.get("progress") or {}
+        total = batch.get("total") or 0
+        finished = progress.get("done", 0) + progress.get("skipped", 0) + progress.get("error", 0)
+        st.progress(finished / total if total else 0.0, text=f"{batch.get('status', 'unknown')}: {finished}/{total} PRs")
+        for item in batch.get("prs", []):
+            if item.get("review"):
+                st.markdown(f"**#{item['number']}: {item['title']}** (`{item['status']}`)")
+                st.markdown(item["review"])
+            elif item["status"] == "error":
+                st.markdown(f"**#{item['number']}: {item['title']}** failed: {item['error']}")
 
 # Show login or user info
 if not st.session_state.is_logged_in or not st.session_state.oauth_state:
     st.write("Please log in with GitHub to continue.")
     if st.button("Login with GitHub"):
-        resp = requests.get(f"{BACKEND}/login/github")
+        resp = http_session().get(f"{BACKEND}/login/github", timeout=20)
         if resp.ok:
             login_data = resp.json()
             auth_url = login_data["auth_url"]
@@ -101,151 +395,35 @@ st.session_state.repo_url = st.text_input(
 )
 
 if st.session_state.repo_url and st.button("List PRs"):
-    try:
-        resp = requests.get(
-            f"{BACKEND}/api/list-prs",
-            params={"repo_url": st.session_state.repo_url, "state": st.session_state.oauth_state},
-            timeout=60
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        st.session_state.prs = data.get("prs", [])
-        st.session_state.review = ""
-    except Exception as e:
-        st.error(f"Error fetching PRs: {e}")
-        st.session_state.prs = []
-        st.session_state.review = ""
+    st.session_state.prs = []
+    st.session_state.next_cursor = None
+    st.session_state.reviews = {}
+    load_prs()
 
 if st.session_state.prs:
     st.subheader("Open Pull Requests")
+    if st.button("Refresh CI status"):
+        fetch_pr_dashboard.clear()
+        fetch_pr_status.clear()
+        fetch_pr_check_summaries.clear()
+    dashboard = get_pr_dashboard(st.session_state.repo_url, st.session_state.oauth_state)
+    bulk_review_panel()
     for pr in st.session_state.prs:
-        with st.expander(f"#{pr['number']}: {pr['title']} (by {pr['author']})"):
-            st.markdown(f"[View on GitHub]({pr['url']})")
-            st.markdown(f"**Commits in this PR:** `{pr.get('commit_count', '?')}`")
-
-            # Show latest CI status
-            pr_status = get_pr_status(st.session_state.repo_url, pr['number'], st.session_state.oauth_state)
-            state_icon = {
-                "success": "✅",
-                "failure": "❌",
-                "pending": "⏳",
-                "unknown": "❔"
-            }
-            st.markdown(
-                f"**Latest CI Status:** {state_icon.get(pr_status['state'], '❔')} `{pr_status['state']}`"
-            )
-            if pr_status.get("checks"):
-                st.markdown("**Status Checks:**")
-                for check in pr_status["checks"]:
-                    st.markdown(
-                        f"- **{check['context']}**: {state_icon.get(check['state'], '❔')} "
-                        f"`{check['state']}` — {check['description'] or ''} "
-                        f"[Details]({check['target_url']})"
-                    )
-
-            # Show inline linter/test summaries and annotations
-            check_summaries = get_pr_check_summaries(st.session_state.repo_url, pr['number'], st.session_state.oauth_state)
-            if check_summaries:
-                st.markdown("**Inline Lint/Test Results:**")
-                for run in check_summaries:
-                    status_icon2 = {
-                        "success": "✅",
-                        "failure": "❌",
-                        "neutral": "🟡",
-                        "cancelled": "🚫",
-                        "timed_out": "⏱️",
-                        "action_required": "⚠️"
-                    }
-                    icon = status_icon2.get((run["status"] or "").lower(), "❔")
-                    st.markdown(f"- **{run['title']}**: {icon} `{run['status']}`")
-                    if run["summary"]:
-                        st.code(run["summary"], language="markdown")
-                    # Display each annotation inline:
-                    if run.get("annotations"):
-                        for anno in run["annotations"]:
-                            st.markdown(
-                                f"`{anno.get('path', 'file')}` "
-                                f"**L{anno.get('start_line', '?')}** "
-                                f"`{anno.get('annotation_level', '').upper()}` - "
-                                f"{anno.get('message', '')}"
-                            )
-                    if run.get("details_url"):
-                        st.markdown(f"[Full Details]({run['details_url']})")
-
-            # Show all commits with code/diffs
-            if st.button(f"Show All Commits & Diffs for PR #{pr['number']}", key=f"commits_{pr['number']}"):
-                commits = get_pr_commits_with_diffs(st.session_state.repo_url, pr['number'], st.session_state.oauth_state)
-                if commits:
-                    for c in commits:
-                        st.markdown(
-                            f"**Commit `{c['sha'][:7]}` by `{c['author']}` on `{c['date'][:10]}`**<br/>"
-                            f"<span style='color:#888'>{c['message']}</span>",
-                            unsafe_allow_html=True
-                        )
-                        for f in c['files']:
-                            st.markdown(
-                                f"<details><summary>{f['filename']}</summary>\n\n"
-                                f"```diff\n{f['patch']}\n```\n</details>",
-                                unsafe_allow_html=True
-                            )
-                else:
-                    st.info("No commits found or unable to load.")
-
-            # Review/Approve buttons
-            if st.button(f"Review PR #{pr['number']}", key=f"review_{pr['number']}"):
-                st.session_state.review = "Reviewing... (may take up to 1 min)"
-                try:
-                    r = requests.get(
-                        f"{BACKEND}/api/review-pr",
-                        params={
-                            "repo_url": st.session_state.repo_url,
-                            "pr_number": pr['number'],
-                            "state": st.session_state.oauth_state
-                        },
-                        timeout=120
-                    )
-                    if r.headers.get('Content-Type', '').startswith('application/json'):
-                        review_data = r.json()
-                        if "review" in review_data:
-                            st.session_state.review = review_data["review"]
-                        elif "error" in review_data:
-                            st.session_state.review = f"Error: {review_data['error']}"
-                        else:
-                            st.session_state.review = "No review returned."
-                    else:
-                        st.session_state.review = f"Error: {r.text}"
-                except Exception as e:
-                    st.session_state.review = f"Error fetching review: {e}"
-            if st.session_state.review and st.session_state.review != "Reviewing... (may take up to 1 min)":
-                if st.session_state.review.startswith("Error"):
-                    st.error(st.session_state.review)
-                else:
-                    st.info(st.session_state.review)
-            if st.button(f"Approve PR #{pr['number']}", key=f"approve_{pr['number']}"):
-                try:
-                    r = requests.post(
-                        f"{BACKEND}/api/approve-pr",
-                        params={
-                            "repo_url": st.session_state.repo_url,
-                            "pr_number": pr['number'],
-                            "state": st.session_state.oauth_state
-                        },
-                        timeout=20
-                    )
-                    if r.ok:
-                        st.success("PR Approved!")
-                    else:
-                        st.error(f"Failed to approve PR: {r.text}")
-                except Exception as e:
-                    st.error(f"Failed to approve PR: {e}")
+        pr_panel(pr, dashboard.get(pr['number']))
+    if st.session_state.next_cursor and st.button("Load more PRs"):
+        load_prs(st.session_state.next_cursor)
+        st.rerun()
 
 if st.session_state.is_logged_in and st.session_state.oauth_state:
     if st.button("Logout"):
         st.session_state.oauth_state = ""
         st.session_state.is_logged_in = False
         st.session_state.prs = []
-        st.session_state.review = ""
+        st.session_state.next_cursor = None
+        st.session_state.reviews = {}
+        st.session_state.commits = {}
         st.session_state.repo_url = ""
         st.session_state.user_info = {}
+        st.session_state.bulk_batch_id = ""
         st.query_params.clear()
-        st.experimental_rerun()
+        st.rerun()